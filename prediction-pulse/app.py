@@ -15,14 +15,29 @@ Usage:
     streamlit run app.py
 """
 
+import os
+
+import numpy as np
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import select, func, desc
+from sqlalchemy import and_, bindparam, case, select, func, desc, inspect, or_
+from sqlalchemy.orm import aliased
 
-from db import get_engine, get_session, init_db, Market, Contract, Price
+from db import (
+    SCHEMA_VERSION,
+    get_engine,
+    get_schema_version,
+    get_session,
+    init_db,
+    Market,
+    Contract,
+    Price,
+)
+from price_archive import get_archive_dir, read_price_history
 
 
 # Page config
@@ -34,83 +49,97 @@ st.set_page_config(
 )
 
 
+DB_PATH = os.path.join(os.path.dirname(__file__), "prediction_pulse.db")
+
+# Arrow-backed dtypes for the markets table's price columns; pinned because an
+# all-NULL column (e.g. last_price of untraded markets) would otherwise be
+# inferred as strings
+PRICE_DTYPES = {
+    "last_price": "double[pyarrow]",
+    "volume_24h": "int64[pyarrow]",
+}
+
+# Column types for price history, built batch-by-batch straight from rows
+PRICE_HISTORY_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("us")),
+    ("last_price", pa.float64()),
+    ("bid_price", pa.float64()),
+    ("ask_price", pa.float64()),
+    ("volume_24h", pa.int64()),
+])
+PRICE_HISTORY_BATCH_SIZE = 2000
+
+# Price history charts are thinned to roughly this many points
+MAX_CHART_POINTS = 2000
+
+
 def utcnow():
     return datetime.now(timezone.utc)
 
 
 @st.cache_resource
-def get_db_session():
-    """Get a cached database session."""
-    import os
-    from sqlalchemy import text
-    db_path = os.path.join(os.path.dirname(__file__), "prediction_pulse.db")
-    
-    # Check if database needs migration (source column added)
-    if os.path.exists(db_path):
-        try:
-            engine = get_engine(db_path)
-            session = get_session(engine)
-            # Test if source column exists
-            session.execute(text("SELECT source FROM markets LIMIT 1"))
-            session.close()
-        except:
+def get_db_engine(db_path: str = DB_PATH):
+    """Get a cached database engine, migrating and seeding the database if needed."""
+    engine = get_engine(db_path)
+    
+    # Check if database needs migration (source column added); the inspector
+    # reads sqlite_master directly rather than probing with a query. Files
+    # already stamped with the current schema version skip the check.
+    if os.path.exists(db_path) and get_schema_version(engine) < SCHEMA_VERSION:
+        insp = inspect(engine)
+        needs_reset = (
+            "markets" not in insp.get_table_names()
+            or "source" not in {c["name"] for c in insp.get_columns("markets")}
+        )
+        if needs_reset:
             # Old schema - delete and recreate
+            engine.dispose()
             os.remove(db_path)
     
-    engine = get_engine(db_path)
     init_db(engine)
     
-    # Auto-seed if database is empty
-    session = get_session(engine)
-    market_count = session.query(Market).count()
-    if market_count == 0:
-        session.close()
+    # Auto-seed if database is empty (stops at the first row, unlike COUNT(*))
+    with get_session(engine) as session:
+        is_empty = session.execute(select(Market.id).limit(1)).first() is None
+    if is_empty:
         from seed_sample_data import seed_database
         seed_database(db_path)
-        session = get_session(engine)
     
-    return session
+    return engine
+
+
+def latest_price_id():
+    """
+    Correlated subquery for the newest price id of the enclosing contract.
+    
+    One backward seek on ix_prices_contract_timestamp for each contract that
+    survives the filters, instead of ranking every price.
+    """
+    newer_price = aliased(Price)
+    return (
+        select(newer_price.id)
+        .where(newer_price.contract_id == Contract.id)
+        .order_by(desc(newer_price.timestamp))
+        .limit(1)
+        .correlate(Contract)
+        .scalar_subquery()
+    )
 
 
-def load_markets_with_prices(
-    session,
+def markets_query(
+    *columns,
     category: str = None,
     status: str = "open",
     source: str = None,
-) -> pd.DataFrame:
-    """Load all markets with their latest price data."""
-    
-    # Subquery to get latest price per contract
-    latest_price_subq = (
-        select(
-            Price.contract_id,
-            func.max(Price.timestamp).label("max_ts")
-        )
-        .group_by(Price.contract_id)
-        .subquery()
-    )
-    
-    # Main query joining markets, contracts, and latest prices
+    future_only: bool = False,
+    now: datetime = None,
+):
+    """Select `columns` for each market contract and its latest price, filtered and ordered by volume."""
     query = (
-        select(
-            Market.market_id,
-            Market.source,
-            Market.title,
-            Market.category,
-            Market.status,
-            Market.expiry_ts,
-            Market.updated_at,
-            Contract.contract_ticker,
-            Contract.side,
-            Price.last_price,
-            Price.bid_price,
-            Price.ask_price,
-            Price.volume_24h,
-            Price.timestamp.label("price_timestamp"),
-        )
+        select(*columns)
+        .select_from(Market)
         .join(Contract, Contract.market_id == Market.market_id)
-        .join(latest_price_subq, Contract.id == latest_price_subq.c.contract_id)
-        .join(Price, (Price.contract_id == Contract.id) & (Price.timestamp == latest_price_subq.c.max_ts))
+        .join(Price, Price.id == latest_price_id())
     )
     
     # Apply filters
@@ -120,31 +149,73 @@ def load_markets_with_prices(
         query = query.where(Market.category.ilike(f"%{category}%"))
     if source and source != "All":
         query = query.where(Market.source == source.lower())
+    if future_only:
+        query = query.where(or_(Market.expiry_ts.is_(None), Market.expiry_ts > (now or utcnow())))
     
-    query = query.order_by(desc(Price.volume_24h))
-    
-    result = session.execute(query)
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(result.fetchall())
-    if len(df) == 0:
-        return pd.DataFrame()
-    
-    df.columns = [
-        "market_id", "source", "title", "category", "status", "expiry_ts", "updated_at",
-        "contract_ticker", "side", "last_price", "bid_price", "ask_price", 
-        "volume_24h", "price_timestamp"
-    ]
-    
-    return df
+    return query.order_by(desc(Price.volume_24h))
 
 
-def load_price_history(session, contract_ticker: str, days: int = 7) -> pd.DataFrame:
-    """Load price history for a specific contract."""
-    
-    cutoff = utcnow() - timedelta(days=days)
+@st.cache_data(ttl=60, show_spinner=False)
+def load_markets_for_table(
+    category: str = None,
+    status: str = "open",
+    source: str = None,
+    future_only: bool = False,
+    db_path: str = DB_PATH,
+    now: datetime = None,
+) -> pd.DataFrame:
+    """
+    Load the markets table: each market's latest price, limited to the shown columns.
+    
+    Cached per filter combination, so widget interactions that don't change
+    the filters are served from memory instead of re-running the join.
+    `now` (default: current UTC time) is the cutoff used by `future_only`.
+    Bid/ask is formatted by SQLite into one display string, so the two
+    floats never reach Python.
+    """
+    bid_ask = case(
+        (
+            and_(Price.bid_price.isnot(None), Price.ask_price.isnot(None)),
+            func.printf("%d/%d", func.round(Price.bid_price), func.round(Price.ask_price)),
+        ),
+        else_="N/A",
+    ).label("bid_ask")
+    
+    query = markets_query(
+        Market.source,
+        Market.title,
+        Market.category,
+        Market.expiry_ts,
+        Contract.contract_ticker,
+        Price.last_price,
+        bid_ask,
+        Price.volume_24h,
+        category=category,
+        status=status,
+        source=source,
+        future_only=future_only,
+        now=now,
+    )
     
-    query = (
+    with get_session(get_db_engine(db_path)) as session:
+        return pd.read_sql_query(
+            query,
+            session.connection(),
+            parse_dates=["expiry_ts"],
+            dtype=PRICE_DTYPES,
+            dtype_backend="pyarrow",
+        )
+
+
+@st.cache_resource
+def get_price_history_query():
+    """
+    Build the price history query once per server process.
+    
+    Ticker and cutoff are bound parameters, so every chart render reuses the
+    same statement object and the engine's compiled SQL for it.
+    """
+    return (
         select(
             Price.timestamp,
             Price.last_price,
@@ -153,44 +224,85 @@ def load_price_history(session, contract_ticker: str, days: int = 7) -> pd.DataF
             Price.volume_24h,
         )
         .join(Contract, Contract.id == Price.contract_id)
-        .where(Contract.contract_ticker == contract_ticker)
-        .where(Price.timestamp >= cutoff)
+        .where(Contract.contract_ticker == bindparam("ticker"))
+        .where(Price.timestamp >= bindparam("cutoff"))
         .order_by(Price.timestamp)
     )
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_price_history(contract_ticker: str, days: int = 7, db_path: str = DB_PATH) -> pd.DataFrame:
+    """
+    Load price history for a specific contract.
     
-    result = session.execute(query)
-    df = pd.DataFrame(result.fetchall())
+    Rows are streamed in batches into Arrow arrays, so a long history is never
+    held as one big list of Python tuples next to the finished DataFrame.
+    """
     
-    if len(df) == 0:
-        return pd.DataFrame()
+    cutoff = utcnow() - timedelta(days=days)
+    batches = []
     
-    df.columns = ["timestamp", "last_price", "bid_price", "ask_price", "volume_24h"]
-    return df
+    with get_session(get_db_engine(db_path)) as session:
+        result = session.execute(
+            get_price_history_query(),
+            {"ticker": contract_ticker, "cutoff": cutoff},
+            execution_options={"yield_per": PRICE_HISTORY_BATCH_SIZE},
+        )
+        for rows in result.partitions():
+            columns = zip(*rows)
+            batches.append(pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, PRICE_HISTORY_SCHEMA)],
+                schema=PRICE_HISTORY_SCHEMA,
+            ))
+    
+    table = pa.Table.from_batches(batches, schema=PRICE_HISTORY_SCHEMA)
+    # Keep timestamps as numpy datetimes for Plotly; prices stay Arrow-backed
+    return table.to_pandas(
+        types_mapper=lambda t: None if pa.types.is_timestamp(t) else pd.ArrowDtype(t)
+    )
+
 
+@st.cache_data(ttl=60, show_spinner=False)
+def load_price_history_parquet(contract_ticker: str, days: int = 7, archive_dir: str = None) -> pd.DataFrame:
+    """Load price history for a contract from the Parquet archive (see price_archive.py)."""
+    cutoff = utcnow() - timedelta(days=days)
+    table = read_price_history(contract_ticker, cutoff, archive_dir)
+    return table.to_pandas(
+        types_mapper=lambda t: None if pa.types.is_timestamp(t) else pd.ArrowDtype(t)
+    )
 
-def get_categories(session) -> list[str]:
-    """Get unique categories from database."""
-    query = select(Market.category).distinct().where(Market.category.isnot(None))
-    result = session.execute(query)
-    categories = [r[0] for r in result.fetchall() if r[0]]
-    return ["All"] + sorted(categories)
+
+@st.cache_data(ttl=600)
+def get_categories(db_path: str = DB_PATH) -> list[str]:
+    """Get unique categories from database (an index walk on markets.category)."""
+    query = (
+        select(Market.category)
+        .distinct()
+        .where(Market.category.isnot(None), Market.category != "")
+        .order_by(Market.category)
+    )
+    with get_session(get_db_engine(db_path)) as session:
+        categories = session.scalars(query).all()
+    return ["All"] + categories
 
 
-def get_sources(session) -> list[str]:
+@st.cache_data(ttl=60)
+def get_sources(db_path: str = DB_PATH) -> list[str]:
     """Get unique sources from database."""
     query = select(Market.source).distinct().where(Market.source.isnot(None))
-    result = session.execute(query)
-    sources = [r[0] for r in result.fetchall() if r[0]]
+    with get_session(get_db_engine(db_path)) as session:
+        result = session.execute(query)
+        sources = [r[0] for r in result.fetchall() if r[0]]
     return ["All"] + sorted([s.capitalize() for s in sources])
 
 
-def render_sidebar(session):
+def render_sidebar(db_path: str = DB_PATH):
     """Render the sidebar with filters."""
     st.sidebar.title("🎯 Prediction Pulse")
     st.sidebar.markdown("---")
     
     # Source filter
-    sources = get_sources(session)
+    sources = get_sources(db_path)
     selected_source = st.sidebar.selectbox(
         "Source",
         options=sources,
@@ -198,7 +310,7 @@ def render_sidebar(session):
     )
     
     # Category filter
-    categories = get_categories(session)
+    categories = get_categories(db_path)
     selected_category = st.sidebar.selectbox(
         "Category",
         options=categories,
@@ -233,93 +345,58 @@ def render_sidebar(session):
     }
 
 
-def render_market_table(df: pd.DataFrame) -> str | None:
-    """Render the main markets table. Returns selected market ticker."""
+def render_market_table(df: pd.DataFrame) -> pd.Series | None:
+    """Render the main markets table. Returns the selected market's row."""
     
     if df.empty:
         st.warning("No markets found. Run the ingestion script first:")
         st.code("python ingest_all.py")
         return None
     
-    # Prepare display dataframe
-    display_df = df.copy()
-    
-    # Format columns
-    display_df["Probability"] = display_df["last_price"].apply(
-        lambda x: f"{x:.0f}%" if pd.notna(x) else "N/A"
-    )
-    display_df["Bid/Ask"] = display_df.apply(
-        lambda r: f"{r['bid_price']:.0f}/{r['ask_price']:.0f}" 
-        if pd.notna(r['bid_price']) and pd.notna(r['ask_price']) 
-        else "N/A",
-        axis=1
-    )
-    display_df["Volume (24h)"] = display_df["volume_24h"].apply(
-        lambda x: f"{x:,.0f}" if pd.notna(x) else "N/A"
-    )
-    display_df["Expiry"] = display_df["expiry_ts"].apply(
-        lambda x: x.strftime("%Y-%m-%d") if pd.notna(x) else "N/A"
-    )
-    display_df["Source"] = display_df["source"].apply(
-        lambda x: x.capitalize() if x else "N/A"
+    # Prepare display dataframe; numeric columns stay numeric and are
+    # formatted client-side by column_config, so sorting works in the UI.
+    # assign() builds a new frame, so the loaded data itself is never modified.
+    display_df = df.assign(
+        source=df["source"].fillna("").str.capitalize().replace("", "N/A"),
     )
     
-    # Select columns for display
-    table_df = display_df[[
-        "Source", "title", "Probability", "Bid/Ask", "Volume (24h)", "Expiry", "category", "contract_ticker"
-    ]].rename(columns={
-        "title": "Market",
-        "category": "Category",
-        "contract_ticker": "Ticker"
-    })
-    
     # Show table with selection
-    st.subheader(f"📈 Markets ({len(table_df)})")
+    st.subheader(f"📈 Markets ({len(display_df)})")
+    st.caption("Select a row to view its price history.")
     
-    # Use data editor for selection
-    selected = st.dataframe(
-        table_df,
+    event = st.dataframe(
+        display_df,
         use_container_width=True,
         hide_index=True,
+        column_order=[
+            "source", "title", "last_price", "bid_ask", "volume_24h", "expiry_ts", "category", "contract_ticker"
+        ],
         column_config={
-            "Source": st.column_config.TextColumn("Source", width="small"),
-            "Market": st.column_config.TextColumn("Market", width="large"),
-            "Probability": st.column_config.TextColumn("Prob", width="small"),
-            "Bid/Ask": st.column_config.TextColumn("Bid/Ask", width="small"),
-            "Volume (24h)": st.column_config.TextColumn("Vol 24h", width="small"),
-            "Expiry": st.column_config.TextColumn("Expiry", width="small"),
-            "Category": st.column_config.TextColumn("Category", width="medium"),
-            "Ticker": st.column_config.TextColumn("Ticker", width="medium"),
+            "source": st.column_config.TextColumn("Source", width="small"),
+            "title": st.column_config.TextColumn("Market", width="large"),
+            "last_price": st.column_config.NumberColumn("Prob", format="%.0f%%", width="small"),
+            "bid_ask": st.column_config.TextColumn("Bid/Ask", width="small"),
+            "volume_24h": st.column_config.NumberColumn("Vol 24h", format="%,d", width="small"),
+            "expiry_ts": st.column_config.DateColumn("Expiry", format="YYYY-MM-DD", width="small"),
+            "category": st.column_config.TextColumn("Category", width="medium"),
+            "contract_ticker": st.column_config.TextColumn("Ticker", width="medium"),
         },
         height=400,
+        key="market_table",
+        on_select="rerun",
+        selection_mode="single-row",
     )
     
-    # Market selector dropdown
-    st.markdown("---")
-    ticker_options = ["Select a market..."] + display_df["contract_ticker"].tolist()
-    
-    def format_option(x):
-        if x == "Select a market...":
-            return x
-        row = display_df[display_df['contract_ticker']==x]
-        if len(row) > 0:
-            source = row['source'].iloc[0].capitalize()
-            title = row['title'].iloc[0][:45]
-            return f"[{source}] {x} - {title}..."
-        return x
-    
-    selected_ticker = st.selectbox(
-        "Select market to view price history:",
-        options=ticker_options,
-        format_func=format_option
-    )
-    
-    if selected_ticker != "Select a market...":
-        return selected_ticker
+    # Selected rows are positions in df, regardless of UI sorting, so the
+    # row can be returned directly instead of searched for by ticker. A
+    # selection can outlive a filter change that shrinks the table.
+    selected_rows = event.selection.rows
+    if selected_rows and selected_rows[0] < len(df):
+        return df.iloc[selected_rows[0]]
     return None
 
 
-def render_price_chart(session, ticker: str, market_title: str, source: str):
+def render_price_chart(ticker: str, market_title: str, source: str):
     """Render price history chart for a market."""
     
     source_label = source.capitalize() if source else "Unknown"
@@ -328,20 +405,33 @@ def render_price_chart(session, ticker: str, market_title: str, source: str):
     # Time range selector
     days = st.selectbox("Time range", [1, 7, 14, 30], index=1, format_func=lambda x: f"{x} day{'s' if x > 1 else ''}")
     
-    # Load data
-    df = load_price_history(session, ticker, days=days)
+    # Load data; the Parquet archive serves history when it is enabled
+    archive_dir = get_archive_dir()
+    if archive_dir:
+        df = load_price_history_parquet(ticker, days=days, archive_dir=archive_dir)
+    else:
+        df = load_price_history(ticker, days=days)
     
     if df.empty:
         st.info("No price history available for this market yet. Run the ingestion script multiple times to build history.")
         return
     
-    # Create chart
+    # Downsample long histories so the chart payload stays bounded; the
+    # stats below still use every point
+    step = max(1, len(df) // MAX_CHART_POINTS)
+    chart_df = df.iloc[::step]
+    
+    # Plain numpy arrays skip Plotly's per-trace Series conversion
+    x = chart_df["timestamp"].to_numpy()
+    y_last = chart_df["last_price"].to_numpy(dtype=float, na_value=np.nan)
+    
+    # Create chart (WebGL traces stay responsive with thousands of points)
     fig = go.Figure()
     
     # Add last price line
-    fig.add_trace(go.Scatter(
-        x=df["timestamp"],
-        y=df["last_price"],
+    fig.add_trace(go.Scattergl(
+        x=x,
+        y=y_last,
         mode="lines+markers",
         name="Last Price",
         line=dict(color="#00D4AA", width=2),
@@ -350,16 +440,16 @@ def render_price_chart(session, ticker: str, market_title: str, source: str):
     
     # Add bid/ask spread as filled area
     if df["bid_price"].notna().any() and df["ask_price"].notna().any():
-        fig.add_trace(go.Scatter(
-            x=df["timestamp"],
-            y=df["ask_price"],
+        fig.add_trace(go.Scattergl(
+            x=x,
+            y=chart_df["ask_price"].to_numpy(dtype=float, na_value=np.nan),
             mode="lines",
             name="Ask",
             line=dict(color="rgba(255,100,100,0.3)", width=1),
         ))
-        fig.add_trace(go.Scatter(
-            x=df["timestamp"],
-            y=df["bid_price"],
+        fig.add_trace(go.Scattergl(
+            x=x,
+            y=chart_df["bid_price"].to_numpy(dtype=float, na_value=np.nan),
             mode="lines",
             name="Bid",
             line=dict(color="rgba(100,255,100,0.3)", width=1),
@@ -378,11 +468,12 @@ def render_price_chart(session, ticker: str, market_title: str, source: str):
     
     st.plotly_chart(fig, use_container_width=True)
     
-    # Show stats
+    # Show stats (numpy floats, so a missing last price is NaN rather than pd.NA)
+    last_prices = df["last_price"].to_numpy(dtype=float, na_value=np.nan)
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        current = df["last_price"].iloc[-1] if len(df) > 0 else None
-        st.metric("Current", f"{current:.1f}%" if current else "N/A")
+        current = last_prices[-1]
+        st.metric("Current", f"{current:.1f}%" if pd.notna(current) else "N/A")
     with col2:
         high = df["last_price"].max()
         st.metric("High", f"{high:.1f}%" if pd.notna(high) else "N/A")
@@ -390,8 +481,8 @@ def render_price_chart(session, ticker: str, market_title: str, source: str):
         low = df["last_price"].min()
         st.metric("Low", f"{low:.1f}%" if pd.notna(low) else "N/A")
     with col4:
-        if len(df) > 1:
-            change = df["last_price"].iloc[-1] - df["last_price"].iloc[0]
+        change = last_prices[-1] - last_prices[0] if len(last_prices) > 1 else np.nan
+        if pd.notna(change):
             st.metric("Change", f"{change:+.1f}%")
         else:
             st.metric("Change", "N/A")
@@ -400,37 +491,30 @@ def render_price_chart(session, ticker: str, market_title: str, source: str):
 def main():
     """Main dashboard entry point."""
     
-    # Get database session
-    session = get_db_session()
+    # Make sure the database exists (and is seeded) before anything queries it
+    get_db_engine(DB_PATH)
     
     # Render sidebar and get filters
-    filters = render_sidebar(session)
+    filters = render_sidebar(DB_PATH)
     
     # Main content
     st.title("Prediction Pulse")
     st.caption("Real-time prediction market data from Kalshi & Polymarket")
     
     # Load and display markets
-    df = load_markets_with_prices(
-        session,
+    df = load_markets_for_table(
         category=filters["category"],
         status=filters["status"],
         source=filters["source"],
+        future_only=filters["future_only"],
     )
     
-  # Filter by future expiry if selected
-    if filters["future_only"] and not df.empty:
-        now = pd.Timestamp.utcnow().tz_localize(None)
-        df["expiry_ts"] = pd.to_datetime(df["expiry_ts"]).dt.tz_localize(None)
-        df = df[df["expiry_ts"].isna() | (df["expiry_ts"] > now)]
-    
     # Show market table and get selection
-    selected_ticker = render_market_table(df)
+    market_row = render_market_table(df)
     
     # Show price chart if market selected
-    if selected_ticker and not df.empty:
-        market_row = df[df["contract_ticker"] == selected_ticker].iloc[0]
-        render_price_chart(session, selected_ticker, market_row["title"], market_row["source"])
+    if market_row is not None:
+        render_price_chart(market_row["contract_ticker"], market_row["title"], market_row["source"])
 
 
 if __name__ == "__main__":
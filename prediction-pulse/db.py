@@ -10,6 +10,8 @@ Three-table schema:
 from datetime import datetime, timezone
 from sqlalchemy import (
     create_engine,
+    event,
+    insert,
     Column,
     Integer,
     String,
@@ -17,7 +19,9 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Index,
+    select,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 
 Base = declarative_base()
@@ -37,9 +41,9 @@ class Market(Base):
     market_id = Column(String, unique=True, nullable=False, index=True)  # Source's ID
     source = Column(String, nullable=False, default="kalshi", index=True)  # kalshi, polymarket
     title = Column(String, nullable=False)
-    category = Column(String, nullable=True)
+    category = Column(String, nullable=True, index=True)
     status = Column(String, default="open")  # open, closed, settled
-    expiry_ts = Column(DateTime, nullable=True)
+    expiry_ts = Column(DateTime, nullable=True, index=True)
     created_at = Column(DateTime, default=utcnow)
     updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
@@ -103,9 +107,142 @@ class Price(Base):
 
 
 # Database connection utilities
+# Write-friendly settings: WAL journaling with NORMAL sync needs far fewer
+# fsyncs per commit than the default rollback journal, and lets the dashboard
+# keep reading while an ingester writes.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA foreign_keys=ON",
+)
+
+
 def get_engine(db_path: str = "prediction_pulse.db"):
     """Create SQLAlchemy engine for SQLite database"""
-    return create_engine(f"sqlite:///{db_path}", echo=False)
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        echo=False,
+        # Pooled connections may be handed to Streamlit's script threads
+        connect_args={"check_same_thread": False},
+        # Room for every dashboard filter combination's compiled SQL
+        query_cache_size=1200,
+    )
+    return enable_sqlite_pragmas(engine)
+
+
+def enable_sqlite_pragmas(engine):
+    """Apply SQLITE_PRAGMAS to every new connection made by the engine"""
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+    
+    return engine
+
+
+# Upserts shared by the ingesters and the seeder. They are built once at import
+# and executed with a list of row dicts (executemany), so SQLAlchemy reuses
+# one compiled statement however many rows a batch has.
+MARKET_UPDATE_COLUMNS = ("title", "category", "status", "expiry_ts", "updated_at")
+CONTRACT_UPDATE_COLUMNS = ("side", "description")
+
+_market_insert = sqlite_upsert(Market)
+MARKET_UPSERT = _market_insert.on_conflict_do_update(
+    index_elements=["market_id"],
+    # Update everything except created_at
+    set_={col: getattr(_market_insert.excluded, col) for col in MARKET_UPDATE_COLUMNS},
+)
+
+_contract_insert = sqlite_upsert(Contract)
+CONTRACT_UPSERT = _contract_insert.on_conflict_do_update(
+    index_elements=["contract_ticker"],
+    set_={col: getattr(_contract_insert.excluded, col) for col in CONTRACT_UPDATE_COLUMNS},
+).returning(Contract.contract_ticker, Contract.id)
+
+
+# Columns compared when skipping upserts that would not change anything
+MARKET_COMPARE_COLUMNS = ("title", "category", "status", "expiry_ts")
+
+# Keeps IN (...) lists well under SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _stored_value(value):
+    # SQLite DateTime columns keep the wall-clock time and drop tzinfo
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def load_existing(session, key_column, columns, keys) -> dict:
+    """Map each stored key in `keys` to a tuple of its `columns` values"""
+    keys = list(keys)
+    existing = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+        query = select(key_column, *columns).where(key_column.in_(chunk))
+        for key, *values in session.execute(query):
+            existing[key] = tuple(values)
+    return existing
+
+
+def bulk_upsert_markets(session, rows: list[dict], skip_unchanged: bool = False) -> int:
+    """
+    Insert or update market rows keyed on market_id; returns the rows written
+
+    With skip_unchanged, rows whose MARKET_COMPARE_COLUMNS already match the
+    database are left out, so steady-state runs don't rewrite (or bump
+    updated_at on) markets that haven't moved.
+    """
+    if skip_unchanged and rows:
+        columns = [getattr(Market, col) for col in MARKET_COMPARE_COLUMNS]
+        existing = load_existing(session, Market.market_id, columns, (row["market_id"] for row in rows))
+        rows = [
+            row for row in rows
+            if existing.get(row["market_id"]) != tuple(_stored_value(row[col]) for col in MARKET_COMPARE_COLUMNS)
+        ]
+    if rows:
+        session.execute(MARKET_UPSERT, rows)
+    return len(rows)
+
+
+def bulk_upsert_contracts(session, rows: list[dict], skip_unchanged: bool = False) -> dict[str, int]:
+    """
+    Insert or update contract rows keyed on contract_ticker; returns ticker -> id
+
+    With skip_unchanged, contracts whose side and description already match
+    are not rewritten; their ids come from the lookup instead.
+    """
+    if not rows:
+        return {}
+    contract_ids = {}
+    if skip_unchanged:
+        columns = [Contract.id, *(getattr(Contract, col) for col in CONTRACT_UPDATE_COLUMNS)]
+        existing = load_existing(session, Contract.contract_ticker, columns, (row["contract_ticker"] for row in rows))
+        changed = []
+        for row in rows:
+            stored = existing.get(row["contract_ticker"])
+            if stored is not None and stored[1:] == tuple(row[col] for col in CONTRACT_UPDATE_COLUMNS):
+                contract_ids[row["contract_ticker"]] = stored[0]
+            else:
+                changed.append(row)
+        rows = changed
+    if rows:
+        # RETURNING hands back every written row's id, so no follow-up SELECT is needed
+        contract_ids.update(session.execute(CONTRACT_UPSERT, rows).all())
+    return contract_ids
+
+
+def bulk_insert_prices(session, rows: list[dict]) -> int:
+    """Insert price snapshot rows with a single executemany; returns the row count"""
+    if rows:
+        session.execute(insert(Price), rows)
+    return len(rows)
 
 
 def get_session(engine=None):
@@ -116,9 +253,36 @@ def get_session(engine=None):
     return Session()
 
 
+# Stored in PRAGMA user_version once init_db has brought a database up to
+# date; bump it whenever tables or indexes change
+SCHEMA_VERSION = 2
+
+# Indexes earlier schema versions created that are no longer declared
+DROPPED_INDEXES = ("ix_prices_contract_ts_desc",)
+
+
+def get_schema_version(engine) -> int:
+    """Read the schema version recorded in the database file (0 if never set)"""
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
 def init_db(engine=None):
-    """Create all tables in the database"""
+    """Create all tables in the database, skipping databases already at SCHEMA_VERSION"""
     if engine is None:
         engine = get_engine()
+    if get_schema_version(engine) >= SCHEMA_VERSION:
+        return engine
+    
     Base.metadata.create_all(engine)
+    # create_all skips tables that already exist, so also add any indexes
+    # introduced after the database file was first created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    
+    with engine.begin() as conn:
+        for name in DROPPED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
     return engine
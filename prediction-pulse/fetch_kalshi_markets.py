@@ -11,12 +11,38 @@ Usage:
     python fetch_kalshi_markets.py
     python fetch_kalshi_markets.py --category politics
     python fetch_kalshi_markets.py --limit 20
+
+Reading is public, but authenticated requests get higher rate limits. Set
+KALSHI_API_KEY_ID and KALSHI_PRIVATE_KEY_PATH (RSA key in PEM format) to
+sign every request. Requires cryptography.
 """
 
 import argparse
+import base64
+import os
+import time
 import requests
-from datetime import datetime
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Iterator
+from urllib.parse import urlparse
+
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+try:
+    from ciso8601 import parse_datetime as _parse_datetime
+except ImportError:
+    def _parse_datetime(value: str) -> datetime:
+        # datetime.fromisoformat only accepts a trailing "Z" from Python 3.11
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
 
 
 # Kalshi API base URL (public, no auth required for reading)
@@ -26,6 +52,138 @@ KALSHI_API_BASE = "https://api.elections.kalshi.com/trade-api/v2"
 KALSHI_API_BASE_ALT = "https://trading-api.kalshi.com/trade-api/v2"
 
 
+class KalshiAuth(requests.auth.AuthBase):
+    """Sign requests with a Kalshi API key (RSA-PSS over timestamp + method + path)."""
+
+    def __init__(self, key_id: str, private_key):
+        self.key_id = key_id
+        self.private_key = private_key
+
+    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        timestamp = str(int(time.time() * 1000))
+        # The signed message covers the path only, not the query string
+        message = f"{timestamp}{request.method}{urlparse(request.url).path}"
+        signature = self.private_key.sign(
+            message.encode(),
+            padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.DIGEST_LENGTH),
+            hashes.SHA256(),
+        )
+        request.headers["KALSHI-ACCESS-KEY"] = self.key_id
+        request.headers["KALSHI-ACCESS-SIGNATURE"] = base64.b64encode(signature).decode()
+        request.headers["KALSHI-ACCESS-TIMESTAMP"] = timestamp
+        return request
+
+
+def _load_auth() -> KalshiAuth | None:
+    """Build request signing from KALSHI_API_KEY_ID / KALSHI_PRIVATE_KEY_PATH, if set."""
+    key_id = os.getenv("KALSHI_API_KEY_ID")
+    key_path = os.getenv("KALSHI_PRIVATE_KEY_PATH")
+    if not key_id or not key_path:
+        return None
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        print("Kalshi API key is set but cryptography is not installed; using public access")
+        return None
+    # A bad key must not break importers that never call Kalshi (e.g. ingest_all --poly-only)
+    try:
+        with open(key_path, "rb") as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Could not load Kalshi private key from {key_path} ({e}); using public access")
+        return None
+    if not isinstance(private_key, rsa.RSAPrivateKey):
+        print(f"Kalshi private key in {key_path} is not an RSA key; using public access")
+        return None
+    return KalshiAuth(key_id, private_key)
+
+
+def _build_session() -> requests.Session:
+    """Create a pooled HTTP session so paginated requests reuse keep-alive connections."""
+    session = requests.Session()
+    session.auth = _load_auth()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=16, max_retries=retry))
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip",
+    })
+    return session
+
+
+_SESSION = _build_session()
+
+
+def is_authenticated() -> bool:
+    """Whether requests on the shared session are signed with an API key."""
+    return _SESSION.auth is not None
+
+
+def close_session():
+    """Close pooled connections held by the shared HTTP session."""
+    _SESSION.close()
+
+
+def _decode(response: requests.Response) -> dict:
+    """
+    Decode a JSON response body directly from its bytes (orjson when installed).
+    
+    A non-JSON body (e.g. an HTML error page) raises requests' JSONDecodeError,
+    a RequestException, just like response.json() would.
+    """
+    try:
+        return _json.loads(response.content)
+    except ValueError as e:
+        # JSON decode errors from both json and orjson subclass ValueError
+        raise requests.exceptions.JSONDecodeError(
+            getattr(e, "msg", str(e)), response.text, getattr(e, "pos", 0), response=response,
+        ) from e
+
+
+def _is_host_failure(error: requests.exceptions.RequestException) -> bool:
+    """Whether an error means the host is unavailable, as opposed to a bad request."""
+    # RetryError is what the adapter raises once retries on 429/5xx run out
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.RetryError)):
+        return True
+    response = error.response if isinstance(error, requests.exceptions.HTTPError) else None
+    return response is not None and response.status_code >= 500
+
+
+def _get_from(base: str, path: str, params: dict = None) -> dict:
+    response = _SESSION.get(f"{base}{path}", params=params, timeout=30)
+    response.raise_for_status()
+    return _decode(response)
+
+
+def _get(path: str, params: dict = None) -> dict:
+    """
+    GET a Kalshi API path, falling back to the alternative base URL.
+    
+    Retries on transient errors are handled by the session adapter; the
+    fallback only kicks in once the primary host has given up (connection
+    errors, timeouts and 5xx). Client errors such as 400/401/404 are raised
+    straight away, and if both hosts fail the primary host's error is raised.
+    """
+    try:
+        return _get_from(KALSHI_API_BASE, path, params)
+    except requests.exceptions.RequestException as e:
+        if not _is_host_failure(e):
+            raise
+        primary_error = e
+    try:
+        return _get_from(KALSHI_API_BASE_ALT, path, params)
+    except requests.exceptions.RequestException:
+        raise primary_error
+
+
 def fetch_events(limit: int = 100, status: str = "open", cursor: str = None) -> dict:
     """
     Fetch events (market groups) from Kalshi.
@@ -33,7 +191,6 @@ def fetch_events(limit: int = 100, status: str = "open", cursor: str = None) ->
     Events are containers for related markets (e.g., "2024 Presidential Election"
     contains markets for each state).
     """
-    url = f"{KALSHI_API_BASE}/events"
     params = {
         "limit": limit,
         "status": status,
@@ -41,9 +198,7 @@ def fetch_events(limit: int = 100, status: str = "open", cursor: str = None) ->
     if cursor:
         params["cursor"] = cursor
     
-    response = requests.get(url, params=params, timeout=30)
-    response.raise_for_status()
-    return response.json()
+    return _get("/events", params=params)
 
 
 def fetch_markets(
@@ -57,7 +212,6 @@ def fetch_markets(
     
     A market is a single yes/no question with a specific resolution date.
     """
-    url = f"{KALSHI_API_BASE}/markets"
     params = {
         "limit": limit,
         "status": status,
@@ -67,19 +221,79 @@ def fetch_markets(
     if event_ticker:
         params["event_ticker"] = event_ticker
     
-    response = requests.get(url, params=params, timeout=30)
-    response.raise_for_status()
-    return response.json()
+    return _get("/markets", params=params)
+
+
+def iter_market_pages(
+    limit: int = 100,
+    status: str = "open",
+    page_size: int = 100,
+) -> Iterator[list[dict]]:
+    """Yield pages of raw markets by walking the /markets cursor until `limit` markets are returned."""
+    cursor = None
+    remaining = limit
+    while remaining > 0:
+        response = fetch_markets(limit=min(page_size, remaining), status=status, cursor=cursor)
+        markets = response.get("markets", [])
+        if not markets:
+            return
+        yield markets
+        
+        remaining -= len(markets)
+        cursor = response.get("cursor")
+        if not cursor:
+            return
+
+
+def fetch_markets_by_event(
+    limit: int = 100,
+    status: str = "open",
+    workers: int = 8,
+) -> list[dict]:
+    """
+    Fetch up to `limit` markets by requesting each event's markets concurrently.
+    
+    The /markets cursor has to be walked one page at a time, but every event
+    can be queried independently, so after one /events call the per-event
+    requests overlap on the pooled session. Markets are returned in event
+    order.
+    """
+    events = fetch_events(limit=limit, status=status).get("events", [])
+    event_tickers = [e["event_ticker"] for e in events if e.get("event_ticker")]
+    if not event_tickers:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(workers, len(event_tickers))) as executor:
+        results = executor.map(
+            lambda event_ticker: fetch_markets(
+                limit=limit, status=status, event_ticker=event_ticker
+            ).get("markets", []),
+            event_tickers,
+        )
+        markets = [m for event_markets in results for m in event_markets]
+    
+    return markets[:limit]
 
 
 def fetch_market_detail(ticker: str) -> dict:
     """Fetch detailed info for a specific market by ticker."""
-    url = f"{KALSHI_API_BASE}/markets/{ticker}"
-    response = requests.get(url, timeout=30)
-    response.raise_for_status()
-    return response.json()
+    return _get(f"/markets/{ticker}")
 
 
+@lru_cache(maxsize=4096)
+def parse_timestamp(value: str) -> datetime | None:
+    """
+    Parse a Kalshi ISO-8601 timestamp, returning None if it is malformed.
+    
+    Cached because markets in the same event usually share a close time.
+    """
+    try:
+        return _parse_datetime(value)
+    except (ValueError, TypeError):
+        return None
+
+
+@lru_cache(maxsize=4096)
 def infer_category(title: str) -> str:
     """Infer category from market title keywords."""
     title_lower = title.lower()
@@ -106,6 +320,14 @@ def infer_category(title: str) -> str:
         return 'Other'
 
 
+def market_category(raw: dict) -> str:
+    """Use the API category if available, otherwise infer it from the title."""
+    api_category = raw.get("category")
+    if api_category and api_category.strip():
+        return api_category
+    return infer_category(raw.get("title") or raw.get("subtitle") or "")
+
+
 def parse_market(raw: dict) -> dict:
     """
     Parse a raw Kalshi market response into a cleaner format.
@@ -114,29 +336,16 @@ def parse_market(raw: dict) -> dict:
     """
     # Extract close time
     close_time = raw.get("close_time") or raw.get("expiration_time")
-    if close_time:
-        try:
-            expiry = datetime.fromisoformat(close_time.replace("Z", "+00:00"))
-        except (ValueError, TypeError):
-            expiry = None
-    else:
-        expiry = None
+    expiry = parse_timestamp(close_time) if close_time else None
 
     # Get title
     title = raw.get("title") or raw.get("subtitle") or ""
-    
-    # Get category - use API category if available, otherwise infer from title
-    api_category = raw.get("category")
-    if api_category and api_category.strip():
-        category = api_category
-    else:
-        category = infer_category(title)
 
     return {
         "ticker": raw.get("ticker"),
         "event_ticker": raw.get("event_ticker"),
         "title": title,
-        "category": category,
+        "category": market_category(raw),
         "status": raw.get("status"),
         "expiry": expiry,
         # Price data (in cents = probability %)
@@ -158,30 +367,62 @@ def filter_markets(
     future_only: bool = True,
 ) -> list[dict]:
     """Filter markets by category, volume, and expiration."""
-    filtered = []
-    now = datetime.now().astimezone()
+    if not markets:
+        return []
     
-    for m in markets:
-        # Category filter
-        if category:
-            market_category = (m.get("category") or "").lower()
-            if category.lower() not in market_category:
-                continue
-        
-        # Volume filter
+    df = pd.DataFrame(markets)
+    mask = pd.Series(True, index=df.index)
+    
+    # Category filter
+    if category:
+        mask &= df["category"].str.contains(category, case=False, na=False, regex=False)
+    
+    # Volume filter (total volume, falling back to 24h volume when it is 0/missing)
+    if min_volume:
+        volume = pd.to_numeric(df["volume"], errors="coerce")
+        volume_24h = pd.to_numeric(df["volume_24h"], errors="coerce")
+        vol = volume.where(volume.fillna(0) != 0, volume_24h).fillna(0)
+        mask &= vol >= min_volume
+    
+    # Future expiry filter (markets without an expiry are kept)
+    if future_only:
+        expiry = pd.to_datetime(df["expiry"], utc=True, errors="coerce")
+        mask &= expiry.isna() | (expiry >= pd.Timestamp.now(tz="UTC"))
+    
+    # Return the original dicts so values keep their types (no NaN/NaT)
+    return [m for m, keep in zip(markets, mask.tolist()) if keep]
+
+
+def iter_filtered_markets(
+    raw_markets: list[dict],
+    category: str = None,
+    min_volume: int = None,
+    future_only: bool = True,
+) -> Iterator[dict]:
+    """
+    Parse raw markets and apply the same filters as filter_markets in one pass.
+
+    Category and volume only need raw fields, so rejected markets are
+    skipped before parse_market pays for timestamp parsing.
+    """
+    category = category.lower() if category else None
+    now = datetime.now(timezone.utc)
+    for raw in raw_markets:
         if min_volume:
-            vol = m.get("volume") or m.get("volume_24h") or 0
-            if vol < min_volume:
+            # Total volume, falling back to 24h volume when it is 0/missing
+            volume = raw.get("volume") or raw.get("volume_24h") or 0
+            if volume < min_volume:
                 continue
-        
-        # Future expiry filter
-        if future_only and m.get("expiry"):
-            if m["expiry"].replace(tzinfo=None) < now.replace(tzinfo=None):
+        if category and category not in market_category(raw).lower():
+            continue
+        market = parse_market(raw)
+        expiry = market["expiry"]
+        if future_only and expiry is not None:
+            if expiry.tzinfo is None:
+                expiry = expiry.replace(tzinfo=timezone.utc)
+            if expiry < now:
                 continue
-        
-        filtered.append(m)
-    
-    return filtered
+        yield market
 
 
 def display_markets(markets: list[dict], detailed: bool = False):
@@ -218,27 +459,28 @@ def main():
     parser.add_argument("--min-volume", type=int, help="Minimum 24h volume")
     parser.add_argument("--detailed", action="store_true", help="Show detailed market info")
     parser.add_argument("--include-expired", action="store_true", help="Include expired markets")
+    parser.add_argument("--by-event", action="store_true", help="Fetch each event's markets concurrently")
     args = parser.parse_args()
 
     print("Fetching markets from Kalshi...")
     
     try:
         # Fetch raw markets
-        response = fetch_markets(limit=args.limit, status="open")
-        raw_markets = response.get("markets", [])
+        if args.by_event:
+            raw_markets = fetch_markets_by_event(limit=args.limit, status="open")
+        else:
+            response = fetch_markets(limit=args.limit, status="open")
+            raw_markets = response.get("markets", [])
         
         print(f"Fetched {len(raw_markets)} raw markets from API")
         
-        # Parse into cleaner format
-        parsed = [parse_market(m) for m in raw_markets]
-        
-        # Apply filters
-        filtered = filter_markets(
-            parsed,
+        # Parse into cleaner format, skipping markets the filters reject
+        filtered = list(iter_filtered_markets(
+            raw_markets,
             category=args.category,
             min_volume=args.min_volume,
             future_only=not args.include_expired,
-        )
+        ))
         
         # Display
         display_markets(filtered, detailed=args.detailed)
@@ -248,28 +490,10 @@ def main():
         
     except requests.exceptions.RequestException as e:
         print(f"Error fetching from Kalshi API: {e}")
-        print("\nTrying alternative API base URL...")
-        
-        # Try alternative URL
-        global KALSHI_API_BASE
-        KALSHI_API_BASE = KALSHI_API_BASE_ALT
-        
-        try:
-            response = fetch_markets(limit=args.limit, status="open")
-            raw_markets = response.get("markets", [])
-            parsed = [parse_market(m) for m in raw_markets]
-            filtered = filter_markets(
-                parsed,
-                category=args.category,
-                min_volume=args.min_volume,
-                future_only=not args.include_expired,
-            )
-            display_markets(filtered, detailed=args.detailed)
-            return filtered
-        except Exception as e2:
-            print(f"Alternative URL also failed: {e2}")
-            return []
+        return []
+    finally:
+        close_session()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -11,15 +11,76 @@ Usage:
 """
 
 import argparse
+import math
+import os
+import re
+import sys
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any
 
+import numpy as np
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+try:
+    from ciso8601 import parse_datetime as _parse_datetime
+except ImportError:
+    def _parse_datetime(value: str) -> datetime:
+        # datetime.fromisoformat only accepts a trailing "Z" from Python 3.11
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
 
 # Polymarket Gamma API base URL
 POLYMARKET_API_BASE = "https://gamma-api.polymarket.com"
 
 
+def _build_session() -> requests.Session:
+    """
+    Create a pooled HTTP session so repeated requests reuse keep-alive connections.
+    
+    Set POLY_CACHE=1 to cache responses on disk for a few minutes (handy when
+    re-running ingestion during development). Requires requests-cache.
+    """
+    session = None
+    if os.getenv("POLY_CACHE"):
+        try:
+            import requests_cache
+            session = requests_cache.CachedSession("poly_cache", backend="sqlite", expire_after=300)
+        except ImportError:
+            print("POLY_CACHE is set but requests-cache is not installed "
+                  "(pip install requests-cache); caching disabled")
+    if session is None:
+        session = requests.Session()
+    
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry))
+    session.headers.update({
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip",
+    })
+    return session
+
+
+_SESSION = _build_session()
+
+
+def close_session():
+    """Close pooled connections held by the shared HTTP session."""
+    _SESSION.close()
+
+
 def fetch_markets(
     limit: int = 100,
     offset: int = 0,
@@ -39,19 +100,56 @@ def fetch_markets(
         "closed": str(closed).lower(),
     }
     
-    response = requests.get(url, params=params, timeout=30)
+    response = _SESSION.get(url, params=params, timeout=30)
     response.raise_for_status()
     return response.json()
 
 
+def fetch_markets_paged(
+    total: int,
+    page_size: int = 100,
+    workers: int = 8,
+    active: bool = True,
+    closed: bool = False,
+) -> list[dict]:
+    """
+    Fetch up to `total` markets by requesting offset pages concurrently.
+    
+    Pages are returned in offset order, so the result matches what a
+    sequential walk over the same offsets would produce.
+    """
+    pages = [
+        (offset, min(page_size, total - offset))
+        for offset in range(0, total, page_size)
+    ]
+    if not pages:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(workers, len(pages))) as executor:
+        results = executor.map(
+            lambda page: fetch_markets(limit=page[1], offset=page[0], active=active, closed=closed),
+            pages,
+        )
+        markets = [m for page_markets in results for m in page_markets]
+    
+    return markets[:total]
+
+
 def fetch_market_detail(condition_id: str) -> dict:
     """Fetch detailed info for a specific market."""
     url = f"{POLYMARKET_API_BASE}/markets/{condition_id}"
-    response = requests.get(url, timeout=30)
+    response = _SESSION.get(url, timeout=30)
     response.raise_for_status()
     return response.json()
 
 
+# Common category tags, matched anywhere inside a tag (e.g. "US-Politics")
+_CATEGORY_TAG_RE = re.compile(
+    r"(politics|crypto|sports|science|entertainment|economics)",
+    re.IGNORECASE,
+)
+
+
 def infer_category(title: str) -> str:
     """Infer category from market title keywords."""
     title_lower = title.lower()
@@ -82,64 +180,109 @@ def extract_category(tags: list) -> str | None:
     """Extract a category from tags list."""
     if not tags:
         return None
-    # Common category tags
-    category_keywords = ["politics", "crypto", "sports", "science", "entertainment", "economics"]
-    for tag in tags:
-        tag_lower = tag.lower() if isinstance(tag, str) else ""
-        for keyword in category_keywords:
-            if keyword in tag_lower:
-                return keyword.capitalize()
-    return tags[0] if tags else None
+    # One scan over all string tags; newlines keep matches from spanning two tags
+    match = _CATEGORY_TAG_RE.search("\n".join(t for t in tags if isinstance(t, str)))
+    if match:
+        return match.group(1).capitalize()
+    return tags[0]
 
 
-def parse_market(raw: dict) -> dict:
+def get_end_date(raw: dict) -> str | None:
+    """Return the raw end date string of a market, if it has one."""
+    end_date = raw.get("endDate") or raw.get("end_date_iso")
+    return end_date if isinstance(end_date, str) else None
+
+
+def get_raw_yes_price(raw: dict) -> Any:
     """
-    Parse a raw Polymarket market response into a cleaner format.
+    Return the unconverted YES price (0-1 scale) of a market, if any.
     
-    Polymarket prices are decimals 0-1, we convert to 0-100 for consistency.
+    Polymarket uses outcomePrices as a JSON string like "[\"0.5\", \"0.5\"]"
+    or has a separate price field.
     """
-    # Parse end date
-    end_date = raw.get("endDate") or raw.get("end_date_iso")
-    if end_date:
-        try:
-            if isinstance(end_date, str):
-                # Handle various date formats
-                end_date = end_date.replace("Z", "+00:00")
-                expiry = datetime.fromisoformat(end_date)
-            else:
-                expiry = None
-        except (ValueError, TypeError):
-            expiry = None
-    else:
-        expiry = None
-
-    # Get price - Polymarket uses outcomePrices as a JSON string like "[\"0.5\", \"0.5\"]"
-    # or has a separate price field
     outcome_prices = raw.get("outcomePrices")
     if outcome_prices:
         try:
             if isinstance(outcome_prices, str):
-                import json
-                prices = json.loads(outcome_prices)
-                yes_price = float(prices[0]) * 100  # Convert to percentage
-            else:
-                yes_price = float(outcome_prices[0]) * 100
-        except (json.JSONDecodeError, IndexError, TypeError, ValueError):
-            yes_price = None
-    else:
-        # Try bestAsk/bestBid fields
-        yes_price = raw.get("bestAsk") or raw.get("lastTradePrice")
-        if yes_price:
-            yes_price = float(yes_price) * 100
+                outcome_prices = _json.loads(outcome_prices)
+            return outcome_prices[0]
+        except (ValueError, IndexError, TypeError, KeyError):
+            # JSON decode errors from both json and orjson subclass ValueError
+            return None
+    # Try bestAsk/bestBid fields
+    return raw.get("bestAsk") or raw.get("lastTradePrice")
+
+
+def get_raw_volume(raw: dict) -> Any:
+    """Return the unconverted volume of a market, if any."""
+    return raw.get("volume") or raw.get("volumeNum")
+
 
-    # Get volume
-    volume = raw.get("volume") or raw.get("volumeNum")
+def parse_market(raw: dict) -> dict:
+    """
+    Parse a raw Polymarket market response into a cleaner format.
+    
+    Polymarket prices are decimals 0-1, we convert to 0-100 for consistency.
+    """
+    end_date = get_end_date(raw)
+    try:
+        expiry = _parse_datetime(end_date) if end_date else None
+    except (ValueError, TypeError):
+        expiry = None
+    
+    price = get_raw_yes_price(raw)
+    try:
+        yes_price = float(price) * 100 if price is not None else None  # Convert to percentage
+    except (ValueError, TypeError):
+        yes_price = None
+    
+    volume = get_raw_volume(raw)
     if volume:
         try:
             volume = int(float(volume))
         except (ValueError, TypeError):
             volume = None
+    
+    return _parse_market_fields(raw, expiry, yes_price, volume)
+
+
+def parse_markets(raw_markets: list[dict]) -> list[dict]:
+    """
+    Parse a batch of raw Polymarket markets.
+    
+    Same as calling parse_market on each market, but end dates, prices and
+    volumes are converted column-wise with pandas/NumPy instead of one
+    market at a time (end dates always come back as UTC datetimes).
+    """
+    end_dates = pd.Series([get_end_date(raw) for raw in raw_markets], dtype=object)
+    expiries = pd.to_datetime(end_dates, utc=True, errors="coerce", format="ISO8601")
+    
+    raw_prices = pd.Series([get_raw_yes_price(raw) for raw in raw_markets], dtype=object)
+    yes_prices = pd.to_numeric(raw_prices, errors="coerce").to_numpy(dtype=float) * 100
+    
+    raw_volumes = pd.Series([get_raw_volume(raw) for raw in raw_markets], dtype=object)
+    volumes = np.trunc(pd.to_numeric(raw_volumes, errors="coerce").to_numpy(dtype=float))
+    
+    return [
+        _parse_market_fields(
+            raw,
+            None if pd.isna(expiry) else expiry.to_pydatetime(),
+            None if math.isnan(yes_price) else yes_price,
+            None if math.isnan(volume) else int(volume),
+        )
+        for raw, expiry, yes_price, volume in zip(
+            raw_markets, expiries, yes_prices.tolist(), volumes.tolist()
+        )
+    ]
 
+
+def _parse_market_fields(
+    raw: dict,
+    expiry: datetime | None,
+    yes_price: float | None,
+    volume: int | None,
+) -> dict:
+    """Build the parsed market dict once the numeric and date fields are resolved."""
     # Get title
     title = raw.get("question") or raw.get("title") or ""
 
@@ -165,54 +308,43 @@ def filter_markets(
     future_only: bool = True,
 ) -> list[dict]:
     """Filter markets by category, volume, and expiration."""
-    filtered = []
-    now = datetime.now().astimezone()
+    if not markets:
+        return []
     
-    for m in markets:
-        # Skip markets without essential data
-        if not m.get("condition_id") or not m.get("title"):
-            continue
-            
-        # Category filter
-        if category:
-            market_category = (m.get("category") or "").lower()
-            if category.lower() not in market_category:
-                continue
-        
-        # Volume filter
-        if min_volume:
-            vol = m.get("volume") or 0
-            if vol < min_volume:
-                continue
-        
-        # Future expiry filter
-        if future_only and m.get("expiry"):
-            try:
-                expiry = m["expiry"]
-                if hasattr(expiry, 'replace'):
-                    if expiry.replace(tzinfo=None) < now.replace(tzinfo=None):
-                        continue
-            except:
-                pass
-        
-        filtered.append(m)
+    df = pd.DataFrame(markets)
+    
+    # Skip markets without essential data
+    mask = df["condition_id"].notna() & df["title"].fillna("").astype(bool)
+    
+    # Category filter
+    if category:
+        mask &= df["category"].str.contains(category, case=False, na=False, regex=False)
     
-    return filtered
+    # Volume filter
+    if min_volume:
+        mask &= pd.to_numeric(df["volume"], errors="coerce").fillna(0) >= min_volume
+    
+    # Future expiry filter (markets without an expiry are kept)
+    if future_only:
+        expiry = pd.to_datetime(df["expiry"], utc=True, errors="coerce")
+        mask &= expiry.isna() | (expiry >= pd.Timestamp.now(tz="UTC"))
+    
+    # Return the original dicts so values keep their types (no NaN/NaT)
+    return [m for m, keep in zip(markets, mask.tolist()) if keep]
 
 
 def display_markets(markets: list[dict], detailed: bool = False):
     """Pretty print market information."""
-    print(f"\n{'='*80}")
-    print(f"Found {len(markets)} markets from Polymarket")
-    print(f"{'='*80}\n")
+    lines = [
+        f"\n{'='*80}",
+        f"Found {len(markets)} markets from Polymarket",
+        f"{'='*80}\n",
+    ]
     
     for i, m in enumerate(markets, 1):
         prob = m.get("yes_price")
-        if prob is not None:
-            prob_str = f"{prob:.0f}%"
-        else:
-            prob_str = "N/A"
-            
+        prob_str = f"{prob:.0f}%" if prob is not None else "N/A"
+        
         expiry = m.get("expiry")
         expiry_str = expiry.strftime("%Y-%m-%d") if expiry else "N/A"
         
@@ -220,13 +352,17 @@ def display_markets(markets: list[dict], detailed: bool = False):
         condition_id = m.get("condition_id", "N/A")[:20]
         category = m.get("category", "N/A")
         
-        print(f"{i:3}. [{condition_id:20}] {prob_str:>5} | [{category:12}] {title}")
+        lines.append(f"{i:3}. [{condition_id:20}] {prob_str:>5} | [{category:12}] {title}")
         
         if detailed:
-            print(f"     Category: {category}")
-            print(f"     Expiry: {expiry_str}")
-            print(f"     Volume: ${m.get('volume', 'N/A'):,}" if m.get('volume') else "     Volume: N/A")
-            print()
+            volume = m.get("volume")
+            lines.append(f"     Category: {category}")
+            lines.append(f"     Expiry: {expiry_str}")
+            lines.append(f"     Volume: ${volume:,}" if volume else "     Volume: N/A")
+            lines.append("")
+    
+    # One write instead of a print (and flush) per line
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def main():
@@ -250,7 +386,7 @@ def main():
         print(f"Fetched {len(raw_markets)} raw markets from API")
         
         # Parse into cleaner format
-        parsed = [parse_market(m) for m in raw_markets]
+        parsed = parse_markets(raw_markets)
         
         # Apply filters
         filtered = filter_markets(
@@ -14,8 +14,15 @@ Usage:
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import ingest_kalshi
+import ingest_polymarket
+from db import get_engine, init_db
+from fetch_kalshi_markets import close_session as close_kalshi_session
+from fetch_polymarket import close_session as close_polymarket_session
+
 
 def main():
     parser = argparse.ArgumentParser(description="Ingest from all prediction market sources")
@@ -38,60 +45,54 @@ def main():
         "errors": [],
     }
 
-    # Ingest from Kalshi
+    sources = []
     if not args.poly_only:
-        print("=" * 40)
-        print("KALSHI")
-        print("=" * 40)
-        try:
-            from ingest_kalshi import main as ingest_kalshi_main
-            import sys
-            
-            # Build args for Kalshi ingestion
-            kalshi_args = ["--limit", str(args.limit), "--db", args.db]
-            if args.quiet:
-                kalshi_args.append("--quiet")
-            
-            # Temporarily replace sys.argv
-            old_argv = sys.argv
-            sys.argv = ["ingest_kalshi.py"] + kalshi_args
-            
-            ingest_kalshi_main()
-            
-            sys.argv = old_argv
-            
-        except Exception as e:
-            print(f"Error ingesting from Kalshi: {e}")
-        print()
-
-    # Ingest from Polymarket
+        sources.append(("KALSHI", ingest_kalshi))
     if not args.kalshi_only:
-        print("=" * 40)
-        print("POLYMARKET")
-        print("=" * 40)
-        try:
-            from ingest_polymarket import main as ingest_polymarket_main
-            import sys
-            
-            # Build args for Polymarket ingestion
-            poly_args = ["--limit", str(args.limit), "--db", args.db]
-            if args.quiet:
-                poly_args.append("--quiet")
-            
-            # Temporarily replace sys.argv
-            old_argv = sys.argv
-            sys.argv = ["ingest_polymarket.py"] + poly_args
-            
-            ingest_polymarket_main()
-            
-            sys.argv = old_argv
-            
-        except Exception as e:
-            print(f"Error ingesting from Polymarket: {e}")
-        print()
+        sources.append(("POLYMARKET", ingest_polymarket))
+
+    # One engine for every source; tables are created once up front
+    engine = get_engine(args.db)
+    init_db(engine)
+
+    try:
+        # Network fetches run concurrently; DB writes stay sequential below
+        with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as executor:
+            futures = [
+                executor.submit(module.fetch_raw_markets, args.limit)
+                for _, module in sources
+            ]
+
+            for (name, module), future in zip(sources, futures):
+                print("=" * 40)
+                print(name)
+                print("=" * 40)
+                try:
+                    raw_markets = future.result()
+                    stats = module.run(
+                        engine,
+                        limit=args.limit,
+                        quiet=args.quiet,
+                        raw_markets=raw_markets,
+                    )
+                    for key in ("markets_processed", "contracts_processed", "prices_inserted"):
+                        total_stats[key] += stats[key]
+                    total_stats["errors"].extend(stats["errors"])
+                except Exception as e:
+                    print(f"Error ingesting from {name.title()}: {e}")
+                    total_stats["errors"].append(f"{name.lower()}: {e}")
+                print()
+    finally:
+        close_kalshi_session()
+        close_polymarket_session()
+        engine.dispose()
 
     print(f"{'='*60}")
     print(f"All ingestion complete at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Total: {total_stats['markets_processed']} markets, "
+          f"{total_stats['contracts_processed']} contracts, "
+          f"{total_stats['prices_inserted']} prices, "
+          f"{len(total_stats['errors'])} errors")
     print(f"{'='*60}")
 
 
@@ -16,14 +16,27 @@ Run this periodically (e.g., every 5-10 minutes) to build price history.
 """
 
 import argparse
+import queue
+import threading
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Iterator
 
-from sqlalchemy import select
-from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
-
-from db import get_engine, get_session, init_db, Market, Contract, Price
-from fetch_kalshi_markets import fetch_markets, parse_market, filter_markets
+from db import (
+    get_engine,
+    get_session,
+    init_db,
+    bulk_insert_prices,
+    bulk_upsert_contracts,
+    bulk_upsert_markets,
+)
+from price_archive import append_prices
+from fetch_kalshi_markets import (
+    fetch_markets_by_event,
+    iter_market_pages,
+    iter_filtered_markets,
+    close_session,
+    is_authenticated,
+)
 
 
 SOURCE = "kalshi"
@@ -33,97 +46,70 @@ def utcnow():
     return datetime.now(timezone.utc)
 
 
-def upsert_market(session, market_data: dict) -> Market:
-    """Insert or update a market record."""
-    stmt = sqlite_upsert(Market).values(
-        market_id=market_data["ticker"],
-        source=SOURCE,
-        title=market_data["title"],
-        category=market_data.get("category"),
-        status=market_data.get("status", "open"),
-        expiry_ts=market_data.get("expiry"),
-        updated_at=utcnow(),
-    )
-    
-    # On conflict, update everything except created_at
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["market_id"],
-        set_={
-            "title": stmt.excluded.title,
-            "category": stmt.excluded.category,
-            "status": stmt.excluded.status,
-            "expiry_ts": stmt.excluded.expiry_ts,
-            "updated_at": stmt.excluded.updated_at,
+def upsert_markets(session, markets: list[dict], now: datetime = None) -> None:
+    """Insert new or changed market records with one executemany."""
+    if now is None:
+        now = utcnow()
+    rows = [
+        {
+            "market_id": m["ticker"],
+            "source": SOURCE,
+            "title": m["title"],
+            "category": m.get("category"),
+            "status": m.get("status", "open"),
+            "expiry_ts": m.get("expiry"),
+            "updated_at": now,
         }
-    )
-    
-    session.execute(stmt)
-    session.flush()
-    
-    # Return the market object
-    return session.execute(
-        select(Market).where(Market.market_id == market_data["ticker"])
-    ).scalar_one()
-
-
-def upsert_contract(session, market_id: str, ticker: str, side: str = "YES") -> Contract:
-    """Insert or update a contract record."""
-    stmt = sqlite_upsert(Contract).values(
-        market_id=market_id,
-        contract_ticker=ticker,
-        side=side,
-        description=f"{side} contract for {market_id}",
-    )
-    
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["contract_ticker"],
-        set_={
-            "side": stmt.excluded.side,
-            "description": stmt.excluded.description,
+        for m in markets
+    ]
+    
+    bulk_upsert_markets(session, rows, skip_unchanged=True)
+
+
+def upsert_contracts(session, markets: list[dict], side: str = "YES") -> dict[str, int]:
+    """
+    Insert or update one contract per market, skipping unchanged ones.
+    
+    For Kalshi the market ticker doubles as the contract ticker. Returns a
+    mapping of contract ticker to contract id.
+    """
+    rows = [
+        {
+            "market_id": m["ticker"],
+            "contract_ticker": m["ticker"],
+            "side": side,
+            "description": f"{side} contract for {m['ticker']}",
         }
-    )
-    
-    session.execute(stmt)
-    session.flush()
-    
-    return session.execute(
-        select(Contract).where(Contract.contract_ticker == ticker)
-    ).scalar_one()
-
-
-def insert_price_snapshot(
-    session,
-    contract_id: int,
-    bid: Optional[float],
-    ask: Optional[float],
-    last: Optional[float],
-    volume_24h: Optional[int],
-) -> Price:
-    """Insert a new price snapshot."""
-    price = Price(
-        contract_id=contract_id,
-        timestamp=utcnow(),
-        bid_price=bid,
-        ask_price=ask,
-        last_price=last,
-        volume_24h=volume_24h,
-    )
-    session.add(price)
-    return price
+        for m in markets
+    ]
+    
+    return bulk_upsert_contracts(session, rows, skip_unchanged=True)
 
 
 def ingest_markets(
     markets: list[dict],
     db_path: str = "prediction_pulse.db",
     verbose: bool = True,
+    engine=None,
+    now: datetime = None,
 ) -> dict:
     """
     Ingest a list of parsed markets into the database.
     
-    Returns stats about what was ingested.
+    Markets and contracts are upserted in bulk and prices inserted with one
+    executemany, so the number of SQL statements stays constant regardless
+    of how many markets are ingested. Pass an already-initialized `engine`
+    to share it across ingesters; otherwise one is created for `db_path`.
+    Every row written gets the same `now` timestamp (default: the current
+    time), so pages of one run can share a snapshot time.
+    
+    Returns stats about what was ingested. A batch that fails is rolled back
+    as a whole and reported in stats["errors"].
     """
-    engine = get_engine(db_path)
-    init_db(engine)  # Ensure tables exist
+    owns_engine = engine is None
+    if owns_engine:
+        engine = get_engine(db_path)
+        init_db(engine)  # Ensure tables exist
     session = get_session(engine)
     
     stats = {
@@ -133,54 +119,60 @@ def ingest_markets(
         "errors": [],
     }
     
+    # De-duplicate on ticker so each market maps to exactly one row
+    markets = list({m["ticker"]: m for m in markets if m.get("ticker")}.values())
+    if not markets:
+        session.close()
+        if owns_engine:
+            engine.dispose()
+        return stats
+    
+    if now is None:
+        now = utcnow()
+    
     try:
-        for m in markets:
-            ticker = m.get("ticker")
-            if not ticker:
-                continue
-                
-            try:
-                # Upsert market
-                market = upsert_market(session, m)
-                stats["markets_processed"] += 1
-                
-                # For Kalshi, each market has a YES contract
-                # The ticker is the contract ticker
-                contract = upsert_contract(
-                    session,
-                    market_id=market.market_id,
-                    ticker=ticker,
-                    side="YES",
-                )
-                stats["contracts_processed"] += 1
-                
-                # Insert price snapshot
-                price = insert_price_snapshot(
-                    session,
-                    contract_id=contract.id,
-                    bid=m.get("yes_bid"),
-                    ask=m.get("yes_ask"),
-                    last=m.get("last_price"),
-                    volume_24h=m.get("volume_24h"),
-                )
-                stats["prices_inserted"] += 1
-                
-                if verbose:
-                    prob = m.get("last_price", "N/A")
-                    print(f"  [Kalshi] {ticker}: {prob}%")
-                    
-            except Exception as e:
-                stats["errors"].append(f"{ticker}: {str(e)}")
-                if verbose:
-                    print(f"  [Kalshi] {ticker}: ERROR - {e}")
+        # One transaction for the whole batch means a single COMMIT
+        with session.begin():
+            upsert_markets(session, markets, now)
+            contract_ids = upsert_contracts(session, markets, side="YES")
+            
+            price_rows = [
+                {
+                    "contract_id": contract_ids[m["ticker"]],
+                    "timestamp": now,
+                    "bid_price": m.get("yes_bid"),
+                    "ask_price": m.get("yes_ask"),
+                    "last_price": m.get("last_price"),
+                    "volume_24h": m.get("volume_24h"),
+                }
+                for m in markets
+            ]
+            prices_inserted = bulk_insert_prices(session, price_rows)
+    except Exception as e:
+        # The rollback discards the whole batch, so it is recorded as one error
+        # (the DBAPI message, without SQLAlchemy's SQL and parameter dump)
+        error = getattr(e, "orig", None) or e
+        stats["errors"].append(f"batch of {len(markets)} markets: {error}")
+        if verbose:
+            print(f"  [Kalshi] ERROR - batch of {len(markets)} markets not ingested: {error}")
+    else:
+        stats["markets_processed"] = len(markets)
+        stats["contracts_processed"] = len(contract_ids)
+        stats["prices_inserted"] = prices_inserted
         
-        session.commit()
+        # Mirror the committed snapshots into the Parquet archive, if enabled
+        append_prices([
+            {**row, "contract_ticker": m["ticker"]}
+            for m, row in zip(markets, price_rows)
+        ])
         
-    except Exception as e:
-        session.rollback()
-        raise e
+        if verbose:
+            # One write for the whole batch instead of a print per market
+            print("\n".join(f"  [Kalshi] {m['ticker']}: {m.get('last_price', 'N/A')}%" for m in markets))
     finally:
         session.close()
+        if owns_engine:
+            engine.dispose()
     
     return stats
 
@@ -202,6 +194,132 @@ def print_summary(stats: dict):
             print(f"  ... and {len(stats['errors']) - 5} more")
 
 
+def fetch_raw_markets(limit: int = 100, by_event: bool = False) -> list[dict]:
+    """Fetch raw open markets from the Kalshi API."""
+    if by_event:
+        return fetch_markets_by_event(limit=limit, status="open")
+    return [m for page in iter_market_pages(limit=limit, status="open") for m in page]
+
+
+def prefetch_pages(pages: Iterator[list[dict]], depth: int = 2) -> Iterator[list[dict]]:
+    """
+    Run the `pages` iterator in a background thread, keeping up to `depth`
+    pages buffered.
+    
+    While the caller ingests one page, the next page's request is already in
+    flight. Exceptions raised while fetching are re-raised to the caller.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    
+    def produce():
+        try:
+            for page in pages:
+                if stop.is_set():
+                    return
+                buffer.put(page)
+        except Exception as e:
+            buffer.put(e)
+            return
+        buffer.put(done)
+    
+    threading.Thread(target=produce, name="kalshi-prefetch", daemon=True).start()
+    try:
+        while (item := buffer.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblock the producer if the caller stopped early
+        stop.set()
+        while not buffer.empty():
+            buffer.get_nowait()
+
+
+def prepare_markets(
+    raw_markets: list[dict],
+    category: str = None,
+    min_volume: int = None,
+) -> list[dict]:
+    """Parse raw API markets and apply the ingestion filters."""
+    return list(iter_filtered_markets(
+        raw_markets,
+        category=category,
+        min_volume=min_volume,
+        future_only=True,
+    ))
+
+
+def run(
+    engine,
+    limit: int = 100,
+    category: str = None,
+    min_volume: int = None,
+    quiet: bool = False,
+    raw_markets: list[dict] = None,
+    by_event: bool = False,
+) -> dict:
+    """
+    Fetch, filter and ingest Kalshi markets using an initialized engine.
+    
+    Pages are ingested as they arrive, with the next page prefetched in the
+    background. Pass `raw_markets` to skip the API call when they were
+    already fetched (e.g. concurrently by ingest_all). Returns the
+    ingestion stats; a failed fetch ends the run and is reported in
+    stats["errors"] along with any pages that were already ingested.
+    """
+    stats = {
+        "markets_processed": 0,
+        "contracts_processed": 0,
+        "prices_inserted": 0,
+        "errors": [],
+    }
+    fetched = kept = 0
+    # One snapshot time for every page of this run
+    now = utcnow()
+    
+    print("Fetching and ingesting markets from Kalshi API...")
+    if raw_markets is not None:
+        pages = iter([raw_markets])
+    elif by_event:
+        # Lazy, so a fetch error surfaces in the page loop like a paged one
+        pages = (fetch_markets_by_event(limit=limit, status="open") for _ in range(1))
+    else:
+        pages = prefetch_pages(iter_market_pages(limit=limit, status="open"))
+    
+    try:
+        page_number = 0
+        while True:
+            try:
+                page = next(pages, None)
+            except Exception as e:
+                print(f"Error fetching from API: {e}")
+                stats["errors"].append(f"fetch page {page_number + 1}: {e}")
+                break
+            if page is None:
+                break
+            
+            # Parse, filter and ingest this page while the next one downloads
+            page_number += 1
+            filtered = prepare_markets(page, category=category, min_volume=min_volume)
+            fetched += len(page)
+            kept += len(filtered)
+            print(f"Page {page_number}: fetched {len(page)} markets, {len(filtered)} after filtering")
+            
+            page_stats = ingest_markets(filtered, engine=engine, verbose=not quiet, now=now)
+            for key in ("markets_processed", "contracts_processed", "prices_inserted"):
+                stats[key] += page_stats[key]
+            stats["errors"].extend(page_stats["errors"])
+    finally:
+        if raw_markets is None:
+            close_session()
+    
+    print(f"Fetched {fetched} markets from API, {kept} after filtering")
+    print_summary(stats)
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest Kalshi data into database")
     parser.add_argument("--limit", type=int, default=100, help="Max markets to fetch")
@@ -209,38 +327,28 @@ def main():
     parser.add_argument("--min-volume", type=int, help="Minimum 24h volume")
     parser.add_argument("--db", type=str, default="prediction_pulse.db", help="Database path")
     parser.add_argument("--quiet", action="store_true", help="Suppress per-market output")
+    parser.add_argument("--by-event", action="store_true", help="Fetch each event's markets concurrently")
     args = parser.parse_args()
 
     print(f"Starting Kalshi ingestion at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Database: {args.db}")
+    print(f"API auth: {'enabled' if is_authenticated() else 'disabled (public rate limits)'}")
     print()
 
-    # Fetch from API
-    print("Fetching markets from Kalshi API...")
+    engine = get_engine(args.db)
+    init_db(engine)
     try:
-        response = fetch_markets(limit=args.limit, status="open")
-        raw_markets = response.get("markets", [])
-        print(f"Fetched {len(raw_markets)} markets from API")
-    except Exception as e:
-        print(f"Error fetching from API: {e}")
-        return
-
-    # Parse and filter
-    parsed = [parse_market(m) for m in raw_markets]
-    filtered = filter_markets(
-        parsed,
-        category=args.category,
-        min_volume=args.min_volume,
-        future_only=True,
-    )
-    print(f"After filtering: {len(filtered)} markets")
-    print()
-
-    # Ingest
-    print("Ingesting into database...")
-    stats = ingest_markets(filtered, db_path=args.db, verbose=not args.quiet)
+        run(
+            engine,
+            limit=args.limit,
+            category=args.category,
+            min_volume=args.min_volume,
+            quiet=args.quiet,
+            by_event=args.by_event,
+        )
+    finally:
+        engine.dispose()
     
-    print_summary(stats)
     print(f"\nCompleted at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 
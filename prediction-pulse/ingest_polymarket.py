@@ -16,13 +16,17 @@ Run this periodically (e.g., every 5-10 minutes) to build price history.
 
 import argparse
 from datetime import datetime, timezone
-from typing import Optional
 
-from sqlalchemy import select
-from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
-
-from db import get_engine, get_session, init_db, Market, Contract, Price
-from fetch_polymarket import fetch_markets, parse_market, filter_markets
+from db import (
+    get_engine,
+    get_session,
+    init_db,
+    bulk_insert_prices,
+    bulk_upsert_contracts,
+    bulk_upsert_markets,
+)
+from price_archive import append_prices
+from fetch_polymarket import fetch_markets_paged, parse_markets, filter_markets, close_session
 
 
 SOURCE = "polymarket"
@@ -32,97 +36,66 @@ def utcnow():
     return datetime.now(timezone.utc)
 
 
-def upsert_market(session, market_data: dict) -> Market:
-    """Insert or update a market record."""
-    market_id = f"poly_{market_data['condition_id']}"
-    
-    stmt = sqlite_upsert(Market).values(
-        market_id=market_id,
-        source=SOURCE,
-        title=market_data["title"],
-        category=market_data.get("category"),
-        status=market_data.get("status", "open"),
-        expiry_ts=market_data.get("expiry"),
-        updated_at=utcnow(),
-    )
-    
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["market_id"],
-        set_={
-            "title": stmt.excluded.title,
-            "category": stmt.excluded.category,
-            "status": stmt.excluded.status,
-            "expiry_ts": stmt.excluded.expiry_ts,
-            "updated_at": stmt.excluded.updated_at,
+def upsert_markets(session, markets: list[dict], now: datetime = None) -> None:
+    """Insert new or changed market records with one executemany."""
+    if now is None:
+        now = utcnow()
+    rows = [
+        {
+            "market_id": f"poly_{m['condition_id']}",
+            "source": SOURCE,
+            "title": m["title"],
+            "category": m.get("category"),
+            "status": m.get("status", "open"),
+            "expiry_ts": m.get("expiry"),
+            "updated_at": now,
         }
-    )
-    
-    session.execute(stmt)
-    session.flush()
+        for m in markets
+    ]
     
-    return session.execute(
-        select(Market).where(Market.market_id == market_id)
-    ).scalar_one()
+    bulk_upsert_markets(session, rows, skip_unchanged=True)
 
 
-def upsert_contract(session, market_id: str, condition_id: str, side: str = "YES") -> Contract:
-    """Insert or update a contract record."""
-    contract_ticker = f"poly_{condition_id}_{side}"
-    
-    stmt = sqlite_upsert(Contract).values(
-        market_id=market_id,
-        contract_ticker=contract_ticker,
-        side=side,
-        description=f"{side} contract",
-    )
+def upsert_contracts(session, markets: list[dict], side: str = "YES") -> dict[str, int]:
+    """
+    Insert or update one contract per market, skipping unchanged ones.
     
-    stmt = stmt.on_conflict_do_update(
-        index_elements=["contract_ticker"],
-        set_={
-            "side": stmt.excluded.side,
-            "description": stmt.excluded.description,
+    Returns a mapping of contract ticker to contract id.
+    """
+    rows = [
+        {
+            "market_id": f"poly_{m['condition_id']}",
+            "contract_ticker": f"poly_{m['condition_id']}_{side}",
+            "side": side,
+            "description": f"{side} contract",
         }
-    )
-    
-    session.execute(stmt)
-    session.flush()
+        for m in markets
+    ]
     
-    return session.execute(
-        select(Contract).where(Contract.contract_ticker == contract_ticker)
-    ).scalar_one()
-
-
-def insert_price_snapshot(
-    session,
-    contract_id: int,
-    bid: Optional[float],
-    ask: Optional[float],
-    last: Optional[float],
-    volume: Optional[int],
-) -> Price:
-    """Insert a new price snapshot."""
-    price = Price(
-        contract_id=contract_id,
-        timestamp=utcnow(),
-        bid_price=bid,
-        ask_price=ask,
-        last_price=last,
-        volume_24h=volume,
-    )
-    session.add(price)
-    return price
+    return bulk_upsert_contracts(session, rows, skip_unchanged=True)
 
 
 def ingest_markets(
     markets: list[dict],
     db_path: str = "prediction_pulse.db",
     verbose: bool = True,
+    engine=None,
+    now: datetime = None,
 ) -> dict:
     """
     Ingest a list of parsed markets into the database.
+    
+    Markets and contracts are upserted in bulk, so the number of SQL
+    statements stays constant regardless of how many markets are ingested.
+    Pass an already-initialized `engine` to share it across ingesters;
+    otherwise one is created for `db_path`. Every row written gets the
+    same `now` timestamp (default: the current time). A batch that fails is
+    rolled back as a whole and reported in stats["errors"].
     """
-    engine = get_engine(db_path)
-    init_db(engine)
+    owns_engine = engine is None
+    if owns_engine:
+        engine = get_engine(db_path)
+        init_db(engine)
     session = get_session(engine)
     
     stats = {
@@ -132,54 +105,66 @@ def ingest_markets(
         "errors": [],
     }
     
+    # De-duplicate on condition_id so each market maps to exactly one row
+    markets = list({m["condition_id"]: m for m in markets if m.get("condition_id")}.values())
+    if not markets:
+        session.close()
+        if owns_engine:
+            engine.dispose()
+        return stats
+    
+    if now is None:
+        now = utcnow()
+    
     try:
-        for m in markets:
-            condition_id = m.get("condition_id")
-            if not condition_id:
-                continue
-                
-            try:
-                # Upsert market
-                market = upsert_market(session, m)
-                stats["markets_processed"] += 1
-                
-                # Create YES contract
-                contract = upsert_contract(
-                    session,
-                    market_id=market.market_id,
-                    condition_id=condition_id,
-                    side="YES",
-                )
-                stats["contracts_processed"] += 1
-                
-                # Insert price snapshot
-                price = insert_price_snapshot(
-                    session,
-                    contract_id=contract.id,
-                    bid=None,  # Polymarket doesn't always provide bid/ask
-                    ask=None,
-                    last=m.get("yes_price"),
-                    volume=m.get("volume"),
-                )
-                stats["prices_inserted"] += 1
-                
-                if verbose:
-                    prob = m.get("yes_price", "N/A")
-                    prob_str = f"{prob:.0f}%" if prob else "N/A"
-                    print(f"  [Polymarket] {condition_id[:20]}: {prob_str}")
-                    
-            except Exception as e:
-                stats["errors"].append(f"{condition_id}: {str(e)}")
-                if verbose:
-                    print(f"  [Polymarket] {condition_id}: ERROR - {e}")
+        # One transaction for the whole batch means a single COMMIT
+        with session.begin():
+            upsert_markets(session, markets, now)
+            contract_ids = upsert_contracts(session, markets, side="YES")
+            
+            price_rows = [
+                {
+                    "contract_id": contract_ids[f"poly_{m['condition_id']}_YES"],
+                    "timestamp": now,
+                    "bid_price": None,  # Polymarket doesn't always provide bid/ask
+                    "ask_price": None,
+                    "last_price": m.get("yes_price"),
+                    "volume_24h": m.get("volume"),
+                }
+                for m in markets
+            ]
+            prices_inserted = bulk_insert_prices(session, price_rows)
+    except Exception as e:
+        # The rollback discards the whole batch, so it is recorded as one error
+        # (the DBAPI message, without SQLAlchemy's SQL and parameter dump)
+        error = getattr(e, "orig", None) or e
+        stats["errors"].append(f"batch of {len(markets)} markets: {error}")
+        if verbose:
+            print(f"  [Polymarket] ERROR - batch of {len(markets)} markets not ingested: {error}")
+    else:
+        stats["markets_processed"] = len(markets)
+        stats["contracts_processed"] = len(contract_ids)
+        stats["prices_inserted"] = prices_inserted
         
-        session.commit()
+        # Mirror the committed snapshots into the Parquet archive, if enabled
+        append_prices([
+            {**row, "contract_ticker": f"poly_{m['condition_id']}_YES"}
+            for m, row in zip(markets, price_rows)
+        ])
         
-    except Exception as e:
-        session.rollback()
-        raise e
+        if verbose:
+            # One write for the whole batch instead of a print per market
+            lines = []
+            for m in markets:
+                prob = m.get("yes_price", "N/A")
+                prob_str = f"{prob:.0f}%" if prob else "N/A"
+                lines.append(f"  [Polymarket] {m['condition_id'][:20]}: {prob_str}")
+            print("\n".join(lines))
     finally:
         session.close()
+        # Closing pooled connections checkpoints the WAL back into the .db file
+        if owns_engine:
+            engine.dispose()
     
     return stats
 
@@ -201,6 +186,72 @@ def print_summary(stats: dict):
             print(f"  ... and {len(stats['errors']) - 5} more")
 
 
+def fetch_raw_markets(limit: int = 100) -> list[dict]:
+    """Fetch raw active markets from the Polymarket API."""
+    return fetch_markets_paged(limit, active=True)
+
+
+def prepare_markets(
+    raw_markets: list[dict],
+    category: str = None,
+    min_volume: int = None,
+) -> list[dict]:
+    """Parse raw API markets and apply the ingestion filters."""
+    parsed = parse_markets(raw_markets)
+    return filter_markets(
+        parsed,
+        category=category,
+        min_volume=min_volume,
+        future_only=True,
+    )
+
+
+def run(
+    engine,
+    limit: int = 100,
+    category: str = None,
+    min_volume: int = None,
+    quiet: bool = False,
+    raw_markets: list[dict] = None,
+) -> dict:
+    """
+    Fetch, filter and ingest Polymarket markets using an initialized engine.
+    
+    Pass `raw_markets` to skip the API call when they were already fetched
+    (e.g. concurrently by ingest_all). Returns the ingestion stats; a failed
+    fetch is reported in stats["errors"].
+    """
+    if raw_markets is None:
+        print("Fetching markets from Polymarket API...")
+        try:
+            raw_markets = fetch_raw_markets(limit)
+        except Exception as e:
+            print(f"Error fetching from API: {e}")
+            stats = {
+                "markets_processed": 0,
+                "contracts_processed": 0,
+                "prices_inserted": 0,
+                "errors": [f"fetch: {e}"],
+            }
+            print_summary(stats)
+            return stats
+        finally:
+            close_session()
+    print(f"Fetched {len(raw_markets)} markets from API")
+
+    # Parse and filter
+    filtered = prepare_markets(raw_markets, category=category, min_volume=min_volume)
+    print(f"After filtering: {len(filtered)} markets")
+    print()
+
+    # Ingest
+    print("Ingesting into database...")
+    stats = ingest_markets(filtered, engine=engine, verbose=not quiet)
+    
+    print_summary(stats)
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest Polymarket data into database")
     parser.add_argument("--limit", type=int, default=100, help="Max markets to fetch")
@@ -214,31 +265,20 @@ def main():
     print(f"Database: {args.db}")
     print()
 
-    # Fetch from API
-    print("Fetching markets from Polymarket API...")
+    engine = get_engine(args.db)
+    init_db(engine)
     try:
-        raw_markets = fetch_markets(limit=args.limit, active=True)
-        print(f"Fetched {len(raw_markets)} markets from API")
-    except Exception as e:
-        print(f"Error fetching from API: {e}")
-        return
-
-    # Parse and filter
-    parsed = [parse_market(m) for m in raw_markets]
-    filtered = filter_markets(
-        parsed,
-        category=args.category,
-        min_volume=args.min_volume,
-        future_only=True,
-    )
-    print(f"After filtering: {len(filtered)} markets")
-    print()
-
-    # Ingest
-    print("Ingesting into database...")
-    stats = ingest_markets(filtered, db_path=args.db, verbose=not args.quiet)
+        run(
+            engine,
+            limit=args.limit,
+            category=args.category,
+            min_volume=args.min_volume,
+            quiet=args.quiet,
+        )
+    finally:
+        # Closing pooled connections checkpoints the WAL back into the .db file
+        engine.dispose()
     
-    print_summary(stats)
     print(f"\nCompleted at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Optional columnar archive of price snapshots.
+
+When PRICE_ARCHIVE_DIR is set, the ingesters append every batch of price
+snapshots to a Hive-partitioned Parquet dataset (one `date=YYYY-MM-DD`
+directory per UTC day), and the dashboard reads chart history from it with
+predicate pushdown instead of walking the prices table row by row.
+
+SQLite stays the source of truth for current prices. To start an archive
+from the history already in the database:
+    PRICE_ARCHIVE_DIR=price_archive python price_archive.py --db prediction_pulse.db
+"""
+
+import argparse
+import os
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import select
+
+from db import get_engine, get_session, Contract, Price
+
+
+ARCHIVE_DIR_ENV = "PRICE_ARCHIVE_DIR"
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("contract_ticker", pa.string()),
+    ("timestamp", pa.timestamp("us")),  # naive UTC, like the prices table
+    ("last_price", pa.float64()),
+    ("bid_price", pa.float64()),
+    ("ask_price", pa.float64()),
+    ("volume_24h", pa.int64()),
+    ("date", pa.string()),
+])
+
+# Partition values are read back as strings so date filters compare ISO text
+_PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+HISTORY_COLUMNS = ["timestamp", "last_price", "bid_price", "ask_price", "volume_24h"]
+
+
+def get_archive_dir() -> str | None:
+    """Archive location from PRICE_ARCHIVE_DIR, or None when archiving is off."""
+    return os.getenv(ARCHIVE_DIR_ENV) or None
+
+
+def _naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def append_prices(rows: list[dict], archive_dir: str = None) -> int:
+    """
+    Append price snapshot rows to the archive; returns the number written.
+
+    Each row needs contract_ticker, timestamp, last_price, bid_price,
+    ask_price and volume_24h. Does nothing when no archive is configured.
+    """
+    archive_dir = archive_dir or get_archive_dir()
+    if not archive_dir or not rows:
+        return 0
+
+    records = []
+    for row in rows:
+        ts = _naive_utc(row["timestamp"])
+        records.append({**row, "timestamp": ts, "date": ts.date().isoformat()})
+
+    table = pa.Table.from_pylist(records, schema=ARCHIVE_SCHEMA)
+    # Every call writes new uniquely named files, so earlier batches are kept
+    pq.write_to_dataset(table, archive_dir, partitioning=_PARTITIONING)
+    return table.num_rows
+
+
+def read_price_history(ticker: str, cutoff: datetime, archive_dir: str = None) -> pa.Table:
+    """Read one contract's snapshots since `cutoff`, oldest first."""
+    archive_dir = archive_dir or get_archive_dir()
+    history_schema = pa.schema([ARCHIVE_SCHEMA.field(col) for col in HISTORY_COLUMNS])
+    if not archive_dir or not os.path.isdir(archive_dir):
+        return history_schema.empty_table()
+
+    cutoff = _naive_utc(cutoff)
+    dataset = ds.dataset(archive_dir, schema=ARCHIVE_SCHEMA, format="parquet", partitioning=_PARTITIONING)
+    table = dataset.to_table(
+        columns=HISTORY_COLUMNS,
+        # The date predicate prunes whole partitions before any file is opened
+        filter=(
+            (ds.field("date") >= cutoff.date().isoformat())
+            & (ds.field("contract_ticker") == ticker)
+            & (ds.field("timestamp") >= pa.scalar(cutoff, type=pa.timestamp("us")))
+        ),
+    )
+    return table.sort_by("timestamp")
+
+
+def export_database(db_path: str, archive_dir: str, batch_size: int = 50_000) -> int:
+    """Copy every price snapshot in the database into the archive."""
+    query = select(
+        Contract.contract_ticker,
+        Price.timestamp,
+        Price.last_price,
+        Price.bid_price,
+        Price.ask_price,
+        Price.volume_24h,
+    ).join(Contract, Contract.id == Price.contract_id)
+
+    written = 0
+    with get_session(get_engine(db_path)) as session:
+        result = session.execute(query, execution_options={"yield_per": batch_size})
+        for rows in result.partitions():
+            written += append_prices([row._asdict() for row in rows], archive_dir)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export price history to the Parquet archive")
+    parser.add_argument("--db", type=str, default="prediction_pulse.db", help="Database path")
+    parser.add_argument("--archive-dir", type=str, default=get_archive_dir(), help=f"Archive directory (default: ${ARCHIVE_DIR_ENV})")
+    args = parser.parse_args()
+
+    if not args.archive_dir:
+        parser.error(f"set {ARCHIVE_DIR_ENV} or pass --archive-dir")
+
+    written = export_database(args.db, args.archive_dir)
+    print(f"Archived {written} price snapshots to {args.archive_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,119 +10,177 @@ Usage:
 """
 
 from datetime import datetime, timedelta, timezone
-import random
+from typing import NamedTuple
 
-from db import get_engine, get_session, init_db, Market, Contract, Price
+import numpy as np
+
+from db import (
+    get_engine,
+    get_session,
+    init_db,
+    bulk_insert_prices,
+    bulk_upsert_contracts,
+    bulk_upsert_markets,
+)
 
 
 def utcnow():
     return datetime.now(timezone.utc)
 
 
-SAMPLE_MARKETS = [
+class SampleMarket(NamedTuple):
+    """One demo market; the seeder generates price history around base_prob."""
+    market_id: str
+    source: str
+    title: str
+    category: str
+    expiry_days: int
+    base_prob: float
+
+
+SAMPLE_MARKETS: tuple[SampleMarket, ...] = (
     # Kalshi-style markets
-    {
-        "market_id": "FED-RATE-DEC-25",
-        "source": "kalshi",
-        "title": "Will the Fed cut rates in December 2025?",
-        "category": "Economics",
-        "expiry_days": 30,
-        "base_prob": 65,
-    },
-    {
-        "market_id": "TRUMP-APPROVAL-50",
-        "source": "kalshi",
-        "title": "Will Trump approval rating exceed 50% by March?",
-        "category": "Politics",
-        "expiry_days": 90,
-        "base_prob": 35,
-    },
-    {
-        "market_id": "GDP-GROWTH-Q1",
-        "source": "kalshi",
-        "title": "Will Q1 2026 GDP growth exceed 2%?",
-        "category": "Economics",
-        "expiry_days": 120,
-        "base_prob": 48,
-    },
-    {
-        "market_id": "SCOTUS-RULING-JAN",
-        "source": "kalshi",
-        "title": "Will SCOTUS rule on immigration case by January?",
-        "category": "Politics",
-        "expiry_days": 45,
-        "base_prob": 72,
-    },
+    SampleMarket(
+        market_id="FED-RATE-DEC-25",
+        source="kalshi",
+        title="Will the Fed cut rates in December 2025?",
+        category="Economics",
+        expiry_days=30,
+        base_prob=65,
+    ),
+    SampleMarket(
+        market_id="TRUMP-APPROVAL-50",
+        source="kalshi",
+        title="Will Trump approval rating exceed 50% by March?",
+        category="Politics",
+        expiry_days=90,
+        base_prob=35,
+    ),
+    SampleMarket(
+        market_id="GDP-GROWTH-Q1",
+        source="kalshi",
+        title="Will Q1 2026 GDP growth exceed 2%?",
+        category="Economics",
+        expiry_days=120,
+        base_prob=48,
+    ),
+    SampleMarket(
+        market_id="SCOTUS-RULING-JAN",
+        source="kalshi",
+        title="Will SCOTUS rule on immigration case by January?",
+        category="Politics",
+        expiry_days=45,
+        base_prob=72,
+    ),
     # Polymarket-style markets
-    {
-        "market_id": "poly_btc-100k-2025",
-        "source": "polymarket",
-        "title": "Will Bitcoin reach $100,000 in 2025?",
-        "category": "Crypto",
-        "expiry_days": 365,
-        "base_prob": 55,
-    },
-    {
-        "market_id": "poly_eth-merge-success",
-        "source": "polymarket",
-        "title": "Will Ethereum stay above $3,000 through Q1?",
-        "category": "Crypto",
-        "expiry_days": 100,
-        "base_prob": 62,
-    },
-    {
-        "market_id": "poly_sp500-5500",
-        "source": "polymarket",
-        "title": "Will S&P 500 close above 5,500 by end of January?",
-        "category": "Markets",
-        "expiry_days": 50,
-        "base_prob": 60,
-    },
-    {
-        "market_id": "poly_unemployment",
-        "source": "polymarket",
-        "title": "Will unemployment rate stay below 4% through Q1?",
-        "category": "Economics",
-        "expiry_days": 100,
-        "base_prob": 68,
-    },
-]
-
-
-def generate_price_history(base_prob: float, days: int = 7, points_per_day: int = 6) -> list[dict]:
-    """Generate realistic-looking price history with random walk."""
-    prices = []
-    current_prob = base_prob + random.uniform(-10, 10)
+    SampleMarket(
+        market_id="poly_btc-100k-2025",
+        source="polymarket",
+        title="Will Bitcoin reach $100,000 in 2025?",
+        category="Crypto",
+        expiry_days=365,
+        base_prob=55,
+    ),
+    SampleMarket(
+        market_id="poly_eth-merge-success",
+        source="polymarket",
+        title="Will Ethereum stay above $3,000 through Q1?",
+        category="Crypto",
+        expiry_days=100,
+        base_prob=62,
+    ),
+    SampleMarket(
+        market_id="poly_sp500-5500",
+        source="polymarket",
+        title="Will S&P 500 close above 5,500 by end of January?",
+        category="Markets",
+        expiry_days=50,
+        base_prob=60,
+    ),
+    SampleMarket(
+        market_id="poly_unemployment",
+        source="polymarket",
+        title="Will unemployment rate stay below 4% through Q1?",
+        category="Economics",
+        expiry_days=100,
+        base_prob=68,
+    ),
+)
+
+
+def mean_reverting_walk(start: float, target: float, noise: np.ndarray, reversion: float = 0.05) -> np.ndarray:
+    """
+    Solve x[i] = x[i-1] + (target - x[i-1]) * reversion + noise[i] for all i at once.
     
-    now = utcnow()
+    The deviation from `target` decays geometrically, so the walk is the
+    noise convolved with powers of (1 - reversion) plus the decaying start.
+    The convolution goes through the FFT, so long histories cost
+    O(n log n) rather than the O(n^2) of a direct convolution.
+    """
+    n = len(noise)
+    if n == 0:
+        return np.empty(0)
+    decay = 1 - reversion
+    powers = decay ** np.arange(n)
+    # Zero-padding to 2n keeps the circular FFT convolution from wrapping around
+    walk = np.fft.irfft(np.fft.rfft(noise, 2 * n) * np.fft.rfft(powers, 2 * n), 2 * n)[:n]
+    return target + walk + (start - target) * decay * powers
+
+
+def generate_price_history(
+    base_prob: float,
+    days: int = 7,
+    points_per_day: int = 6,
+    now: datetime = None,
+    rng: np.random.Generator = None,
+) -> list[dict]:
+    """
+    Generate realistic-looking price history with random walk, ending at `now`.
+    
+    Pass a shared `rng` when generating many histories so they draw from one
+    generator instead of seeding a fresh one per call.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
     total_points = days * points_per_day
     
-    for i in range(total_points):
-        # Random walk with mean reversion
-        drift = (base_prob - current_prob) * 0.05  # Pull toward base
-        noise = random.gauss(0, 2)  # Random noise
-        current_prob = max(1, min(99, current_prob + drift + noise))
-        
-        timestamp = now - timedelta(hours=(total_points - i) * (24 / points_per_day))
-        
-        # Generate bid/ask around last price
-        spread = random.uniform(1, 3)
-        bid = max(1, current_prob - spread / 2)
-        ask = min(99, current_prob + spread / 2)
-        
-        prices.append({
-            "timestamp": timestamp,
-            "last_price": round(current_prob, 1),
-            "bid_price": round(bid, 1),
-            "ask_price": round(ask, 1),
-            "volume_24h": random.randint(1000, 50000),
-        })
+    # Random walk with mean reversion toward base_prob
+    start_prob = base_prob + rng.uniform(-10, 10)
+    probs = np.clip(mean_reverting_walk(start_prob, base_prob, rng.normal(0, 2, total_points)), 1, 99)
+    
+    # Generate bid/ask around last price
+    spread = rng.uniform(1, 3, total_points)
+    bids = np.maximum(1, probs - spread / 2)
+    asks = np.minimum(99, probs + spread / 2)
+    volumes = rng.integers(1000, 50000, total_points, endpoint=True)
+    
+    if now is None:
+        now = utcnow()
+    step = timedelta(hours=24 / points_per_day)
     
-    return prices
+    return [
+        {
+            "timestamp": now - (total_points - i) * step,
+            "last_price": last,
+            "bid_price": bid,
+            "ask_price": ask,
+            "volume_24h": volume,
+        }
+        for i, (last, bid, ask, volume) in enumerate(zip(
+            np.round(probs, 1).tolist(),
+            np.round(bids, 1).tolist(),
+            np.round(asks, 1).tolist(),
+            volumes.tolist(),
+        ))
+    ]
 
 
-def seed_database(db_path: str = "prediction_pulse.db"):
-    """Seed the database with sample markets and price history."""
+def seed_database(db_path: str = "prediction_pulse.db", seed: int = None):
+    """
+    Seed the database with sample markets and price history.
+    
+    Pass `seed` to generate the same price history on every run.
+    """
     
     engine = get_engine(db_path)
     init_db(engine)
@@ -132,50 +190,50 @@ def seed_database(db_path: str = "prediction_pulse.db"):
     print()
     
     try:
+        # Build every row up front with one timestamp, then write them all in
+        # a single transaction
+        now = utcnow()
+        rng = np.random.default_rng(seed)
+        market_rows = []
+        contract_rows = []
+        histories = []
         for m in SAMPLE_MARKETS:
-            # Create market
-            market = Market(
-                market_id=m["market_id"],
-                source=m["source"],
-                title=m["title"],
-                category=m["category"],
-                status="open",
-                expiry_ts=utcnow() + timedelta(days=m["expiry_days"]),
-            )
-            session.merge(market)
-            session.flush()
-            
-            # Create contract
-            contract_ticker = m["market_id"] if m["source"] == "kalshi" else f"{m['market_id']}_YES"
-            contract = Contract(
-                market_id=m["market_id"],
-                contract_ticker=contract_ticker,
-                side="YES",
-                description=f"YES contract for {m['title'][:30]}...",
-            )
-            session.merge(contract)
-            session.flush()
-            
-            # Get contract ID for prices
-            contract = session.query(Contract).filter_by(contract_ticker=contract_ticker).first()
-            
-            # Generate and insert price history
-            prices = generate_price_history(m["base_prob"])
-            for p in prices:
-                price = Price(
-                    contract_id=contract.id,
-                    timestamp=p["timestamp"],
-                    last_price=p["last_price"],
-                    bid_price=p["bid_price"],
-                    ask_price=p["ask_price"],
-                    volume_24h=p["volume_24h"],
-                )
-                session.add(price)
+            market_rows.append({
+                "market_id": m.market_id,
+                "source": m.source,
+                "title": m.title,
+                "category": m.category,
+                "status": "open",
+                "expiry_ts": now + timedelta(days=m.expiry_days),
+                "updated_at": now,
+            })
+            contract_ticker = m.market_id if m.source == "kalshi" else f"{m.market_id}_YES"
+            contract_rows.append({
+                "market_id": m.market_id,
+                "contract_ticker": contract_ticker,
+                "side": "YES",
+                "description": f"YES contract for {m.title[:30]}...",
+            })
+            histories.append((contract_ticker, generate_price_history(m.base_prob, now=now, rng=rng)))
+        
+        with session.begin():
+            # Create (or refresh) markets and contracts; RETURNING hands back
+            # contract ids without a re-query
+            bulk_upsert_markets(session, market_rows)
+            contract_ids = bulk_upsert_contracts(session, contract_rows)
             
-            source_label = m["source"].capitalize()
-            print(f"  [{source_label}] {m['market_id']}: {m['title'][:35]}... ({len(prices)} price points)")
+            # Every market's price history goes in with a single executemany
+            bulk_insert_prices(session, [
+                {"contract_id": contract_ids[ticker], **p}
+                for ticker, prices in histories
+                for p in prices
+            ])
+        
+        print("\n".join(
+            f"  [{m.source.capitalize()}] {m.market_id}: {m.title[:35]}... ({len(prices)} price points)"
+            for m, (_, prices) in zip(SAMPLE_MARKETS, histories)
+        ))
         
-        session.commit()
         print()
         print(f"Seeded {len(SAMPLE_MARKETS)} markets with price history")
         print()
@@ -183,7 +241,6 @@ def seed_database(db_path: str = "prediction_pulse.db"):
         print("  streamlit run app.py")
         
     except Exception as e:
-        session.rollback()
         print(f"Error: {e}")
         raise
     finally: